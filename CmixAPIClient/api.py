@@ -2,8 +2,24 @@
 from __future__ import unicode_literals
 import requests
 import logging
+import threading
+import time
 
-from .error import CmixError
+from contextlib import contextmanager
+from requests.exceptions import ConnectionError, RequestException, SSLError, Timeout
+
+from .buffering import read_body, ResponseBody
+from .bulk import map_concurrently
+from .deadline import Deadline, tightest
+from .error import CmixAuthError, CmixConnectionError, CmixError, CmixTimeoutError
+from .limits import acquire_within, clock, PRIORITY_BATCH, PRIORITY_INTERACTIVE, PRIORITY_NORMAL
+from .survey_xml import SurveyIndexCache
+from .transport import http2_session
+
+try:
+    from urllib.parse import urlparse
+except ImportError:
+    from urlparse import urlparse
 
 log = logging.getLogger(__name__)
 
@@ -36,6 +52,28 @@ CMIX_SERVICES = {
 
 DEFAULT_API_TIMEOUT = 16
 
+
+@contextmanager
+def _transport_errors(method, url):
+    '''
+        Raises the requests exceptions of a call to CMIX as CmixErrors, as
+        HTTP2Session does for httpx's.
+    '''
+    try:
+        yield
+    except Timeout as e:
+        raise CmixTimeoutError(
+            'CMIX did not respond to {} {} in time: {}'.format(method.upper(), url, e), url=url, method=method
+        )
+    except SSLError as e:
+        raise CmixError('{} {} to CMIX failed: {}'.format(method.upper(), url, e), url=url, method=method)
+    except ConnectionError as e:
+        raise CmixConnectionError(
+            'Could not connect to CMIX for {} {}: {}'.format(method.upper(), url, e), url=url, method=method
+        )
+    except RequestException as e:
+        raise CmixError('{} {} to CMIX failed: {}'.format(method.upper(), url, e), url=url, method=method)
+
 # - it seems like this class would work better as a singleton - and
 #   maybe the method above (default_cmix_api) could create the singleton,
 #   authenticate it, then return it - and all subsequent calls to
@@ -52,12 +90,48 @@ class CmixAPI(object):
     SURVEY_STATUS_LIVE = 'LIVE'
     SURVEY_STATUS_CLOSED = 'CLOSED'
 
+    # archive statuses meaning the build failed
+    ARCHIVE_FAILED_STATUSES = ('FAILED', 'ERROR', 'CANCELLED', 'CANCELED')
+
     # valid extra survey url params
     SURVEY_PARAMS_STATUS_AFTER = 'statusAfter'
 
     def __init__(
             self, username=None, password=None, client_id=None, client_secret=None, test=False, timeout=None, *args, **kwargs
     ):
+        '''kwargs:
+
+        archive_reuse_seconds: when set, create_export_archive returns an
+        archive this client created within that many seconds for the same
+        survey, type and filters instead of asking CMIX to build a new one.
+        Archives that get_archive_status reports as failed are not reused.
+
+        session: a requests.Session (or compatible object) used for every
+        request, so several clients can share its connection pools.
+
+        http2: when True and no session is given, requests are multiplexed over
+        HTTP/2 connections (falling back to HTTP/1.1, see
+        CmixAPIClient.transport).
+
+        limiter: an object from CmixAPIClient.limits gating every request.
+
+        hedge_policy: a CmixAPIClient.hedging.HedgePolicy; when set, slow GETs
+        are hedged with a second identical request.
+
+        connect_timeout, read_timeout: separate limits for establishing a
+        connection and for waiting on the response; both default to timeout.
+
+        default_priority: the priority class passed to the limiter for calls
+        that don't have one of their own; see CmixAPIClient.limits.
+
+        spill_threshold: survey XML, definitions and raw results larger than
+        this many bytes are streamed into a temporary file rather than held in
+        memory.
+
+        memory_budget: a CmixAPIClient.buffering.MemoryBudget shared by
+        clients to cap the response bytes they hold in memory at once; bodies
+        that don't fit are streamed into a temporary file.
+        '''
         if None in [username, password, client_id, client_secret]:
             raise CmixError("All authentication data is required.")
         self.username = username
@@ -68,6 +142,194 @@ class CmixAPI(object):
         if test is True:
             self.url_type = 'TEST_URL'
         self.timeout = timeout if timeout is not None else DEFAULT_API_TIMEOUT
+        self.connect_timeout = kwargs.get('connect_timeout', self.timeout)
+        self.read_timeout = kwargs.get('read_timeout', self.timeout)
+        self._authentication_headers = None
+        self._local = threading.local()
+        self.survey_index_cache = SurveyIndexCache()
+        self.archive_reuse_seconds = kwargs.get('archive_reuse_seconds')
+        self._recent_archives = {}
+        self._recent_archives_lock = threading.Lock()
+        self.session = kwargs.get('session')
+        if self.session is None and kwargs.get('http2'):
+            self.session = http2_session()
+        self.limiter = kwargs.get('limiter')
+        self.hedge_policy = kwargs.get('hedge_policy')
+        self.default_priority = kwargs.get('default_priority', PRIORITY_NORMAL)
+        self.spill_threshold = kwargs.get('spill_threshold')
+        self.memory_budget = kwargs.get('memory_budget')
+        self.requests_in_flight = 0
+        self.last_used = None
+        self._activity_lock = threading.Lock()
+        # survey ID: test token, from any response that carried one
+        self._test_tokens = {}
+        self._test_tokens_lock = threading.Lock()
+
+    @contextmanager
+    def deadline(self, seconds=None, deadline=None):
+        '''
+            Bounds every request made by this thread inside the block, including
+            all the sub-requests of composite calls like create_export_archive:
+
+                with cmix.deadline(30) as job:
+                    cmix.create_survey(xml_string)
+
+            Pass an existing Deadline to share one limit (and its cancel()) across
+            threads; nested deadlines all apply.
+        '''
+        if deadline is None:
+            deadline = Deadline(seconds)
+        with self.using_deadlines([deadline]):
+            yield deadline
+
+    @contextmanager
+    def using_deadlines(self, deadlines):
+        previous = self.active_deadlines()
+        self._local.deadlines = previous + list(deadlines)
+        try:
+            yield
+        finally:
+            self._local.deadlines = previous
+
+    def active_deadlines(self):
+        return getattr(self._local, 'deadlines', [])
+
+    @contextmanager
+    def timeouts(self, connect=None, read=None):
+        '''
+            Overrides the connect and/or read timeout for requests made by this
+            thread inside the block.
+        '''
+        previous = getattr(self._local, 'timeouts', None)
+        current = previous or (self.connect_timeout, self.read_timeout)
+        self._local.timeouts = (
+            connect if connect is not None else current[0],
+            read if read is not None else current[1],
+        )
+        try:
+            yield
+        finally:
+            self._local.timeouts = previous
+
+    @contextmanager
+    def priority(self, name):
+        '''
+            Sets the priority class of every request made by this thread inside
+            the block, overriding the defaults of the individual methods.
+        '''
+        previous = self.current_priority()
+        self._local.priority = name
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def current_priority(self):
+        return getattr(self._local, 'priority', None)
+
+    def _timeout(self, timeouts, deadlines):
+        connect, read = timeouts
+        for deadline in deadlines:
+            deadline.check()
+        remaining = tightest(deadlines)
+        if remaining is not None:
+            connect = min(connect, remaining)
+            read = min(read, remaining)
+        if connect == read:
+            return read
+        return (connect, read)
+
+    def _request(self, method, url, priority=None, **kwargs):
+        priority = self.current_priority() or priority or self.default_priority
+        # captured here because a hedged request is sent from another thread
+        timeouts = getattr(self._local, 'timeouts', None) or (self.connect_timeout, self.read_timeout)
+        deadlines = self.active_deadlines()
+        for deadline in deadlines:
+            deadline.check()
+        if method == 'get' and self.hedge_policy is not None:
+            response = self.hedge_policy.execute(
+                urlparse(url).netloc,
+                lambda: self._send(method, url, priority, timeouts, deadlines, **kwargs)
+            )
+        else:
+            response = self._send(method, url, priority, timeouts, deadlines, **kwargs)
+        for deadline in deadlines:
+            if deadline.cancelled:
+                response.close()
+                deadline.check()
+        return response
+
+    @contextmanager
+    def _in_flight(self):
+        with self._activity_lock:
+            self.requests_in_flight += 1
+        try:
+            yield
+        finally:
+            with self._activity_lock:
+                self.requests_in_flight -= 1
+                self.last_used = clock()
+
+    def _send(self, method, url, priority, timeouts, deadlines, **kwargs):
+        with self._in_flight():
+            return self._limited_send(method, url, priority, timeouts, deadlines, **kwargs)
+
+    def _limited_send(self, method, url, priority, timeouts, deadlines, **kwargs):
+        transport = self.session if self.session is not None else requests
+        if self.limiter is None:
+            return self._transmit(transport, method, url, timeout=self._timeout(timeouts, deadlines), **kwargs)
+
+        host = urlparse(url).netloc
+        acquire_within(self.limiter, host, priority, deadlines)
+        started = None
+        status_code = None
+        try:
+            # waiting for the limiter used up part of the deadlines
+            timeout = self._timeout(timeouts, deadlines)
+            started = clock()
+            response = self._transmit(transport, method, url, timeout=timeout, **kwargs)
+            status_code = response.status_code
+            return response
+        finally:
+            self.limiter.release(host, status_code, clock() - started if started is not None else None)
+
+    def _transmit(self, transport, method, url, **kwargs):
+        with _transport_errors(method, url):
+            return getattr(transport, method)(url, **kwargs)
+
+    def _buffered_request(self, method, url, as_file=False, **kwargs):
+        '''
+            Makes a request whose body may be large. Without as_file, a
+            spill_threshold or a memory_budget this is a plain request. Otherwise
+            the body is streamed into a ResponseBody, which is returned in place
+            of the response. As with a plain request, error bodies are returned
+            like any other unless as_file is set, since the file would not hold
+            what was asked for; error responses then raise a CmixError instead.
+        '''
+        if not as_file and self.spill_threshold is None and self.memory_budget is None:
+            return self._request(method, url, **kwargs)
+        response = self._request(method, url, stream=True, **kwargs)
+        if as_file and not 200 <= response.status_code < 300:
+            try:
+                # error bodies are short, so read it for the message before the connection is released
+                log.debug('CMIX returned {} ({} bytes) for {} {}'.format(
+                    response.status_code, len(response.content), method.upper(), url
+                ))
+            finally:
+                response.close()
+            raise CmixError.from_response(
+                response, 'CMIX returned a non-2xx response code for {} {}'.format(method.upper(), url)
+            )
+        with _transport_errors(method, url):
+            return read_body(response, self.spill_threshold, self.memory_budget)
+
+    def _buffered_json(self, response, as_file):
+        if as_file:
+            return response
+        if isinstance(response, ResponseBody):
+            with response:
+                return response.json()
+        return response.json()
 
     def check_auth_headers(self):
         if self._authentication_headers is None:
@@ -84,21 +346,20 @@ class CmixAPI(object):
 
         auth_url = '{}/access-token'.format(CMIX_SERVICES['auth'][self.url_type])
         try:
-            auth_response = requests.post(
+            auth_response = self._request(
+                'post',
                 auth_url,
                 json=auth_payload,
-                headers={"Content-Type": "application/json"},
-                timeout=self.timeout
+                headers={"Content-Type": "application/json"}
             )
-            if auth_response.status_code != 200:
-                raise CmixError(
-                    'CMIX returned a non-200 response code: {} and error {}'.format(
-                        auth_response.status_code,
-                        auth_response.text
-                    )
-                )
+        except CmixError:
+            raise
         except Exception as e:
             raise CmixError('Could not request authorization from CMIX. Error: {}'.format(e))
+        if auth_response.status_code != 200:
+            # rejected credentials are an auth error, an unavailable auth service is not
+            error_class = CmixAuthError if auth_response.status_code < 500 else CmixError
+            raise error_class.from_response(auth_response, 'CMIX returned a non-200 response code')
         auth_json = auth_response.json()
 
         self._authentication_headers = {
@@ -129,10 +390,10 @@ class CmixAPI(object):
                 'responseId': response_id
             }]
         }
-        response = requests.post(url, headers=self._authentication_headers, json=payload, timeout=self.timeout)
+        response = self._request('post', url, headers=self._authentication_headers, json=payload)
         return response.json()
 
-    def fetch_raw_results(self, survey_id, payload):
+    def fetch_raw_results(self, survey_id, payload, as_file=False):
         '''
             This calls the CMIX Reporting API 'response-counts' endpoint and returns
             the data for all of the questions in the survey.
@@ -142,44 +403,35 @@ class CmixAPI(object):
                 {'questionId': 122931},
                 {...}
             ]
+
+            With as_file the undecoded body is returned as a ResponseBody, for
+            a streaming JSON parser or body.json().
         '''
         self.check_auth_headers()
         log.debug('Requesting raw results for CMIX survey {}'.format(survey_id))
         base_url = CMIX_SERVICES['reporting'][self.url_type]
         url = '{}/surveys/{}/response-counts'.format(base_url, survey_id)
-        response = requests.post(url, headers=self._authentication_headers, json=payload, timeout=self.timeout)
-        return response.json()
+        response = self._buffered_request('post', url, as_file, headers=self._authentication_headers, json=payload)
+        return self._buffered_json(response, as_file)
 
     def api_get(self, endpoint, error=''):
         self.check_auth_headers()
         url = '{}/{}'.format(CMIX_SERVICES['survey'][self.url_type], endpoint)
-        response = requests.get(url, headers=self._authentication_headers, timeout=self.timeout)
+        response = self._request('get', url, headers=self._authentication_headers)
         if response.status_code != 200:
             if '' == error:
                 error = 'CMIX returned a non-200 response code'
-            raise CmixError(
-                '{}: {} and error {}'.format(
-                    error,
-                    response.status_code,
-                    response.text
-                )
-            )
+            raise CmixError.from_response(response, error)
         return response.json()
 
     def api_delete(self, endpoint, error=''):
         self.check_auth_headers()
         url = '{}/{}'.format(CMIX_SERVICES['survey'][self.url_type], endpoint)
-        response = requests.delete(url, headers=self._authentication_headers, timeout=self.timeout)
+        response = self._request('delete', url, headers=self._authentication_headers)
         if response.status_code != 200:
             if '' == error:
                 error = 'CMIX returned a non-200 response code'
-            raise CmixError(
-                '{}: {} and error {}'.format(
-                    error,
-                    response.status_code,
-                    response.text
-                )
-            )
+            raise CmixError.from_response(response, error)
         return response.json()
 
     def get_surveys(self, status, *args, **kwargs):
@@ -197,8 +449,11 @@ class CmixAPI(object):
         extra_params = kwargs.get('extra_params')
         if extra_params is not None:
             surveys_url = self.add_extra_url_params(surveys_url, extra_params)
-        surveys_response = requests.get(surveys_url, headers=self._authentication_headers, timeout=self.timeout)
-        return surveys_response.json()
+        surveys_response = self._request('get', surveys_url, headers=self._authentication_headers)
+        surveys = surveys_response.json()
+        if isinstance(surveys, list):
+            self._remember_test_tokens(surveys)
+        return surveys
 
     def add_extra_url_params(self, url, params):
         for param in params:
@@ -209,43 +464,108 @@ class CmixAPI(object):
     def get_survey_data_layouts(self, survey_id):
         self.check_auth_headers()
         data_layouts_url = '{}/surveys/{}/data-layouts'.format(CMIX_SERVICES['survey'][self.url_type], survey_id)
-        data_layouts_response = requests.get(data_layouts_url, headers=self._authentication_headers, timeout=self.timeout)
+        data_layouts_response = self._request('get', data_layouts_url, headers=self._authentication_headers)
         if data_layouts_response.status_code != 200:
-            raise CmixError(
-                'CMIX returned a non-200 response code while getting data_layouts: {} and error {}'.format(
-                    data_layouts_response.status_code,
-                    data_layouts_response.text
-                )
+            raise CmixError.from_response(
+                data_layouts_response,
+                'CMIX returned a non-200 response code while getting data_layouts'
             )
         return data_layouts_response.json()
 
-    def get_survey_definition(self, survey_id):
+    def get_survey_definition(self, survey_id, as_file=False):
+        '''
+            With as_file the undecoded body is returned as a ResponseBody.
+        '''
         self.check_auth_headers()
         definition_url = '{}/surveys/{}/definition'.format(CMIX_SERVICES['survey'][self.url_type], survey_id)
-        definition_response = requests.get(definition_url, headers=self._authentication_headers, timeout=self.timeout)
-        return definition_response.json()
+        definition_response = self._buffered_request('get', definition_url, as_file, headers=self._authentication_headers)
+        return self._buffered_json(definition_response, as_file)
 
-    def get_survey_xml(self, survey_id):
+    def get_survey_xml(self, survey_id, as_file=False):
+        '''
+            Returns the survey XML as bytes or, with as_file, as a ResponseBody
+            that stays on disk when the XML is larger than spill_threshold.
+        '''
         self.check_auth_headers()
         xml_url = '{}/surveys/{}'.format(CMIX_SERVICES['file'][self.url_type], survey_id)
-        xml_response = requests.get(xml_url, headers=self._authentication_headers, timeout=self.timeout)
-        return xml_response.content
+        xml_response = self._buffered_request('get', xml_url, as_file, headers=self._authentication_headers)
+        if not isinstance(xml_response, ResponseBody):
+            return xml_response.content
+        if as_file:
+            return xml_response
+        with xml_response:
+            return xml_response.getvalue()
+
+    def get_survey_index(self, survey_id):
+        '''
+            Returns a SurveyIndex of the questions and responses in the survey's
+            XML. Indexes are cached by survey ID and content hash, so repeated
+            calls only pay for the download.
+        '''
+        if self.spill_threshold is None and self.memory_budget is None:
+            return self.survey_index_cache.get_or_parse(survey_id, self.get_survey_xml(survey_id))
+        # parse straight from the buffered body, which may be on disk
+        with self.get_survey_xml(survey_id, as_file=True) as body:
+            return self.survey_index_cache.get_or_parse(survey_id, body, digest=body.digest)
 
     def get_survey_test_url(self, survey_id):
         self.check_auth_headers()
         survey_url = '{}/surveys/{}'.format(CMIX_SERVICES['survey'][self.url_type], survey_id)
-        survey_response = requests.get(survey_url, headers=self._authentication_headers, timeout=self.timeout)
+        survey_response = self._request(
+            'get',
+            survey_url,
+            priority=PRIORITY_INTERACTIVE,
+            headers=self._authentication_headers
+        )
         test_token = survey_response.json().get('testToken', None)
         if test_token is None:
             raise CmixError('Survey endpoint for CMIX ID {} did not return a test token.'.format(survey_id))
-        test_link = '{}/#/?cmixSvy={}&cmixTest={}'.format(
+        with self._test_tokens_lock:
+            self._test_tokens[survey_id] = test_token
+        return self._format_test_url(survey_id, test_token)
+
+    def _format_test_url(self, survey_id, test_token):
+        return '{}/#/?cmixSvy={}&cmixTest={}'.format(
             CMIX_SERVICES['test'][self.url_type],
             survey_id,
             test_token
         )
-        return test_link
 
-    def get_survey_respondents(self, survey_id, respondent_type, live):
+    def _remember_test_tokens(self, surveys):
+        tokens = dict(
+            (survey['id'], survey['testToken']) for survey in surveys
+            if isinstance(survey, dict) and survey.get('id') is not None and survey.get('testToken') is not None
+        )
+        with self._test_tokens_lock:
+            self._test_tokens.update(tokens)
+
+    def get_survey_test_urls(self, survey_ids, max_workers=None):
+        '''
+            Returns a dict of survey ID to test URL. Test tokens already seen by
+            this client, in get_surveys listings or get_survey_status and
+            get_survey_test_url responses, are reused; the rest are looked up
+            concurrently. Surveys whose lookup fails are logged and left out.
+        '''
+        survey_ids = list(survey_ids)
+        with self._test_tokens_lock:
+            tokens = dict((survey_id, self._test_tokens.get(survey_id)) for survey_id in survey_ids)
+        test_urls = dict(
+            (survey_id, self._format_test_url(survey_id, token)) for survey_id, token in tokens.items() if token is not None
+        )
+        missing = [survey_id for survey_id, token in tokens.items() if token is None]
+        for result in map_concurrently(self.get_survey_test_url, missing, client=self, max_workers=max_workers):
+            if result.error is not None:
+                log.warning('Could not get a test URL for CMIX survey {}: {}'.format(result.item, result.error))
+                continue
+            test_urls[result.item] = result.result
+        return test_urls
+
+    def get_survey_respondents(self, survey_id, respondent_type, live, *args, **kwargs):
+        '''kwargs:
+
+        extra_params: array of additional url params added to the end of the
+        url, formatted the same way as for get_surveys.
+        '''
         self.check_auth_headers()
         respondents_url = '{}/surveys/{}/respondents?respondentType={}&respondentStatus={}'.format(
             CMIX_SERVICES['reporting'][self.url_type],
@@ -253,55 +573,57 @@ class CmixAPI(object):
             "LIVE" if live else "TEST",
             respondent_type,
         )
-        respondents_response = requests.get(respondents_url, headers=self._authentication_headers, timeout=self.timeout)
+        extra_params = kwargs.get('extra_params')
+        if extra_params is not None:
+            respondents_url = self.add_extra_url_params(respondents_url, extra_params)
+        respondents_response = self._request(
+            'get',
+            respondents_url,
+            priority=PRIORITY_BATCH,
+            headers=self._authentication_headers
+        )
         return respondents_response.json()
 
     def get_survey_locales(self, survey_id):
         self.check_auth_headers()
         locales_url = '{}/surveys/{}/locales'.format(CMIX_SERVICES['survey'][self.url_type], survey_id)
-        locales_response = requests.get(locales_url, headers=self._authentication_headers, timeout=self.timeout)
+        locales_response = self._request('get', locales_url, headers=self._authentication_headers)
         if locales_response.status_code != 200:
-            raise CmixError(
-                'CMIX returned a non-200 response code while getting locales: {} and error {}'.format(
-                    locales_response.status_code,
-                    locales_response.text
-                )
-            )
+            raise CmixError.from_response(locales_response, 'CMIX returned a non-200 response code while getting locales')
         return locales_response.json()
 
     def get_survey_status(self, survey_id):
         self.check_auth_headers()
         status_url = '{}/surveys/{}'.format(CMIX_SERVICES['survey'][self.url_type], survey_id)
-        status_response = requests.get(status_url, headers=self._authentication_headers, timeout=self.timeout)
-        status = status_response.json().get('status', None)
+        status_response = self._request(
+            'get',
+            status_url,
+            priority=PRIORITY_INTERACTIVE,
+            headers=self._authentication_headers
+        )
+        survey = status_response.json()
+        status = survey.get('status', None)
+        if survey.get('testToken') is not None:
+            with self._test_tokens_lock:
+                self._test_tokens[survey_id] = survey['testToken']
         if status is None:
-            raise CmixError('Get Survey Status returned without a status. Response: {}'.format(status_response.json()))
+            raise CmixError.from_response(status_response, 'Get Survey Status returned without a status')
         return status.lower()
 
     def get_survey_sections(self, survey_id):
         self.check_auth_headers()
         sections_url = '{}/surveys/{}/sections'.format(CMIX_SERVICES['survey'][self.url_type], survey_id)
-        sections_response = requests.get(sections_url, headers=self._authentication_headers, timeout=self.timeout)
+        sections_response = self._request('get', sections_url, headers=self._authentication_headers)
         if sections_response.status_code != 200:
-            raise CmixError(
-                'CMIX returned a non-200 response code while getting sections: {} and error {}'.format(
-                    sections_response.status_code,
-                    sections_response.text
-                )
-            )
+            raise CmixError.from_response(sections_response, 'CMIX returned a non-200 response code while getting sections')
         return sections_response.json()
 
     def get_survey_sources(self, survey_id):
         self.check_auth_headers()
         sources_url = '{}/surveys/{}/sources'.format(CMIX_SERVICES['survey'][self.url_type], survey_id)
-        sources_response = requests.get(sources_url, headers=self._authentication_headers, timeout=self.timeout)
+        sources_response = self._request('get', sources_url, headers=self._authentication_headers)
         if sources_response.status_code != 200:
-            raise CmixError(
-                'CMIX returned a non-200 response code while getting sources: {} and error {}'.format(
-                    sources_response.status_code,
-                    sources_response.text
-                )
-            )
+            raise CmixError.from_response(sources_response, 'CMIX returned a non-200 response code while getting sources')
         return sources_response.json()
 
     def get_survey_completes(self, survey_id):
@@ -310,48 +632,53 @@ class CmixAPI(object):
     def get_survey_termination_codes(self, survey_id):
         self.check_auth_headers()
         termination_codes_url = '{}/surveys/{}/termination-codes'.format(CMIX_SERVICES['survey'][self.url_type], survey_id)
-        termination_codes_response = requests.get(
+        termination_codes_response = self._request(
+            'get',
             termination_codes_url,
-            headers=self._authentication_headers,
-            timeout=self.timeout
+            headers=self._authentication_headers
         )
         if termination_codes_response.status_code != 200:
-            raise CmixError(
-                'CMIX returned a non-200 response code while getting termination_codes: {} and error {}'.format(
-                    termination_codes_response.status_code,
-                    termination_codes_response.text
-                )
+            raise CmixError.from_response(
+                termination_codes_response,
+                'CMIX returned a non-200 response code while getting termination_codes'
             )
         return termination_codes_response.json()
 
-    def create_export_archive(self, survey_id, export_type):
+    def create_export_archive(
+            self, survey_id, export_type, respondent_type='LIVE', completes=True, in_process=False, terminates=False,
+            reuse_within=None
+    ):
+        '''
+            Asks CMIX to build an export archive of the survey's respondents.
+
+            reuse_within overrides the client's archive_reuse_seconds for this
+            call; pass 0 to always build a new archive.
+        '''
         self.check_auth_headers()
-        archive_url = '{}/surveys/{}/archives'.format(CMIX_SERVICES['survey'][self.url_type], survey_id)
-        headers = self._authentication_headers.copy()
-        headers['Content-Type'] = "application/json"
         payload = {
-            "respondentType": "LIVE",
+            "respondentType": respondent_type,
             "type": export_type,
-            "completes": True,
-            "inProcess": False,
-            "terminates": False
+            "completes": completes,
+            "inProcess": in_process,
+            "terminates": terminates
         }
+        archive_key = (survey_id, export_type, respondent_type, completes, in_process, terminates)
+        if reuse_within is None:
+            reuse_within = self.archive_reuse_seconds
+        if reuse_within:
+            archive_json = self._get_recent_archive(archive_key, reuse_within)
+            if archive_json is not None:
+                log.debug('Reusing CMIX archive {} for survey {}'.format(archive_json.get('id'), survey_id))
+                return archive_json
 
-        archive_response = requests.post(archive_url, json=payload, headers=headers, timeout=self.timeout)
+        archive_url = '{}/surveys/{}/archives'.format(CMIX_SERVICES['survey'][self.url_type], survey_id)
+        headers = self._authentication_headers.copy()
+        headers['Content-Type'] = "application/json"
+        archive_response = self._request('post', archive_url, priority=PRIORITY_BATCH, json=payload, headers=headers)
         if archive_response.status_code != 200:
-            raise CmixError(
-                'CMIX returned a non-200 response code: {} and error {}'.format(
-                    archive_response.status_code,
-                    archive_response.text
-                )
-            )
+            raise CmixError.from_response(archive_response, 'CMIX returned a non-200 response code')
         if archive_response.json().get('error', None) is not None:
-            raise CmixError(
-                'CMIX returned an error with status code {}: {}'.format(
-                    archive_response.status_code,
-                    archive_response.text
-                )
-            )
+            raise CmixError.from_response(archive_response, 'CMIX returned an error with status code')
         archive_json = archive_response.json()
 
         layout_json = self.get_survey_data_layouts(survey_id)
@@ -365,8 +692,36 @@ class CmixAPI(object):
             )
 
         archive_json['dataLayoutId'] = layout_id
+        if reuse_within:
+            self._remember_archive(archive_key, reuse_within, archive_json)
         return archive_json
 
+    def _remember_archive(self, archive_key, reuse_within, archive_json):
+        now = time.time()
+        with self._recent_archives_lock:
+            # drop expired archives here, since their keys may never be asked for again
+            for key, (created_at, window, _) in list(self._recent_archives.items()):
+                if now - created_at > window:
+                    del self._recent_archives[key]
+            self._recent_archives[archive_key] = (now, reuse_within, archive_json.copy())
+
+    def _forget_archive(self, survey_id, archive_id):
+        with self._recent_archives_lock:
+            for key, (_, _, archive_json) in list(self._recent_archives.items()):
+                if key[0] == survey_id and archive_json.get('id') == archive_id:
+                    del self._recent_archives[key]
+
+    def _get_recent_archive(self, archive_key, max_age):
+        with self._recent_archives_lock:
+            recent = self._recent_archives.get(archive_key)
+            if recent is None:
+                return None
+            created_at, _, archive_json = recent
+            if time.time() - created_at > max_age:
+                del self._recent_archives[archive_key]
+                return None
+            return archive_json.copy()
+
     def get_archive_status(self, survey_id, archive_id, layout_id):
         self.check_auth_headers()
         if layout_id is None:
@@ -382,15 +737,14 @@ class CmixAPI(object):
             layout_id,
             archive_id  # The archive ID on CMIX.
         )
-        archive_response = requests.get(archive_url, headers=self._authentication_headers, timeout=self.timeout)
+        archive_response = self._request('get', archive_url, headers=self._authentication_headers)
         if archive_response.status_code > 299:
-            raise CmixError(
-                'CMIX returned an invalid response code getting archive status: HTTP {} and error {}'.format(
-                    archive_response.status_code,
-                    archive_response.text
-                )
-            )
-        return archive_response.json()
+            raise CmixError.from_response(archive_response, 'CMIX returned an invalid response code getting archive status')
+        status_json = archive_response.json()
+        if status_json.get('error') is not None or status_json.get('status') in self.ARCHIVE_FAILED_STATUSES:
+            # a failed build must not be handed out again by create_export_archive
+            self._forget_archive(survey_id, archive_id)
+        return status_json
 
     def update_project(self, project_id, status=None):
         '''
@@ -406,14 +760,9 @@ class CmixAPI(object):
             raise CmixError("No update data was provided for CMIX Project {}".format(project_id))
 
         url = '{}/projects/{}'.format(CMIX_SERVICES['survey'][self.url_type], project_id)
-        response = requests.patch(url, json=payload_json, headers=self._authentication_headers, timeout=self.timeout)
+        response = self._request('patch', url, json=payload_json, headers=self._authentication_headers)
         if response.status_code > 299:
-            raise CmixError(
-                'CMIX returned an invalid response code during project update: HTTP {} and error {}'.format(
-                    response.status_code,
-                    response.text
-                )
-            )
+            raise CmixError.from_response(response, 'CMIX returned an invalid response code during project update')
         return response
 
     def create_survey(self, xml_string):
@@ -424,16 +773,9 @@ class CmixAPI(object):
 
         url = '{}/surveys/data'.format(CMIX_SERVICES['file'][self.url_type])
         payload = {"data": xml_string}
-        response = requests.post(url, payload, headers=self._authentication_headers, timeout=self.timeout)
+        response = self._request('post', url, data=payload, headers=self._authentication_headers)
         if response.status_code > 299:
-            raise CmixError(
-                'Error while creating survey. CMIX responded with status' +
-                ' code {} and text: {} when sent this XML: {}'.format(
-                    response.status_code,
-                    response.text,
-                    xml_string
-                )
-            )
+            raise CmixError.from_response(response, 'Error while creating survey. CMIX responded with status code', xml_string)
         response_json = response.json()
         self.update_project(response_json.get('projectId'), status=self.SURVEY_STATUS_DESIGN)
         return response_json
@@ -441,13 +783,11 @@ class CmixAPI(object):
     def get_survey_simulations(self, survey_id):
         self.check_auth_headers()
         simulations_url = '{}/surveys/{}/simulations'.format(CMIX_SERVICES['survey'][self.url_type], survey_id)
-        simulations_response = requests.get(simulations_url, headers=self._authentication_headers, timeout=self.timeout)
+        simulations_response = self._request('get', simulations_url, headers=self._authentication_headers)
         if simulations_response.status_code != 200:
-            raise CmixError(
-                'CMIX returned a non-200 response code while getting simulations: {} and error {}'.format(
-                    simulations_response.status_code,
-                    simulations_response.text
-                )
+            raise CmixError.from_response(
+                simulations_response,
+                'CMIX returned a non-200 response code while getting simulations'
             )
         return simulations_response.json()
 
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import codecs
+import hashlib
+import io
+import json
+import shutil
+import tempfile
+import threading
+
+CHUNK_SIZE = 64 * 1024
+
+
+class MemoryBudget(object):
+    '''
+        A cap on the response bytes held in memory at once by every client
+        sharing the budget. Bodies that can't reserve room are written to a
+        temporary file instead of waiting.
+    '''
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._lock = threading.Lock()
+
+    def reserve(self, size):
+        with self._lock:
+            if self.used + size > self.max_bytes:
+                return False
+            self.used += size
+            return True
+
+    def release(self, size):
+        with self._lock:
+            self.used -= size
+
+
+class ResponseBody(object):
+    '''
+        A readable binary file holding a response body, in memory until it
+        grows past the spill threshold or the memory budget runs out and in a
+        temporary file after that. The SHA-1 of the body is computed as it is
+        written. Close it (or use it as a context manager) to hand its memory
+        back to the budget and remove the temporary file.
+    '''
+    def __init__(self, spill_threshold=None, budget=None):
+        self.spill_threshold = spill_threshold
+        self.budget = budget
+        self.size = 0
+        self.spilled = False
+        self._file = io.BytesIO()
+        self._reserved = 0
+        self._sha1 = hashlib.sha1()
+
+    def _spill(self):
+        spilled = tempfile.TemporaryFile()
+        self._file.seek(0)
+        shutil.copyfileobj(self._file, spilled)
+        self._file.close()
+        self._file = spilled
+        self.spilled = True
+        self._release()
+
+    def _release(self):
+        if self._reserved and self.budget is not None:
+            self.budget.release(self._reserved)
+        self._reserved = 0
+
+    def write(self, chunk):
+        if not self.spilled:
+            if self.spill_threshold is not None and self.size + len(chunk) > self.spill_threshold:
+                self._spill()
+            elif self.budget is not None:
+                if self.budget.reserve(len(chunk)):
+                    self._reserved += len(chunk)
+                else:
+                    self._spill()
+        self._file.write(chunk)
+        self._sha1.update(chunk)
+        self.size += len(chunk)
+
+    @property
+    def digest(self):
+        return self._sha1.hexdigest()
+
+    def read(self, size=-1):
+        return self._file.read(size)
+
+    def readline(self, size=-1):
+        return self._file.readline(size)
+
+    def seek(self, offset, whence=0):
+        return self._file.seek(offset, whence)
+
+    def tell(self):
+        return self._file.tell()
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def getvalue(self):
+        self._file.seek(0)
+        return self._file.read()
+
+    def json(self, encoding='utf-8'):
+        '''
+            Parses the body as JSON. json.load reads the whole decoded text
+            before parsing, so the text is held in memory alongside the raw
+            bytes of a body that hasn't spilled. Pass the body to a streaming
+            parser instead when that is too much.
+        '''
+        self._file.seek(0)
+        return json.load(codecs.getreader(encoding)(self._file))
+
+    @property
+    def closed(self):
+        return self._file.closed
+
+    def close(self):
+        self._file.close()
+        self._release()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _iter_chunks(response, chunk_size):
+    iter_content = getattr(response, 'iter_content', None)
+    if iter_content is None:
+        # transports without streaming have the whole body already
+        return [response.content]
+    return iter_content(chunk_size)
+
+
+def read_body(response, spill_threshold=None, budget=None, chunk_size=CHUNK_SIZE):
+    '''
+        Reads a response made with stream=True into a ResponseBody, rewound
+        and ready to read.
+    '''
+    body = ResponseBody(spill_threshold, budget)
+    try:
+        for chunk in _iter_chunks(response, chunk_size):
+            body.write(chunk)
+    except BaseException:
+        body.close()
+        raise
+    finally:
+        response.close()
+    body.seek(0)
+    return body
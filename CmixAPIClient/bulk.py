@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import logging
+
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+log = logging.getLogger(__name__)
+
+DEFAULT_WORKERS = 8
+
+BulkResult = namedtuple('BulkResult', ['item', 'result', 'error'])
+
+
+def worker_count(client=None, max_workers=None):
+    '''
+        The number of threads to fan out over. Without an explicit max_workers
+        this is the maximum of the client's limiter, so an adaptive limiter
+        rather than the thread count decides how many requests are in flight.
+    '''
+    if max_workers is not None:
+        return max_workers
+    maximum = getattr(getattr(client, 'limiter', None), 'maximum', None)
+    return maximum if maximum is not None else DEFAULT_WORKERS
+
+
+def _with_context(client, func, priority):
+    # deadlines and priorities are per thread, so carry the caller's into the worker threads
+    deadlines = client.active_deadlines()
+    priority = priority or client.current_priority()
+
+    def call(item):
+        with client.using_deadlines(deadlines):
+            if priority is None:
+                return func(item)
+            with client.priority(priority):
+                return func(item)
+    return call
+
+
+def map_concurrently(func, items, client=None, max_workers=None, priority=None):
+    '''
+        Calls func(item) for every item on a thread pool and yields a
+        BulkResult per item as it completes. Exceptions are returned in the
+        result's error instead of stopping the other items. items can be any
+        iterable; only a bounded number are queued at a time.
+
+        When client is given, any deadline and priority the caller is inside
+        apply to the requests made by the workers too; priority overrides the
+        caller's priority class for the whole fan-out.
+    '''
+    workers = worker_count(client, max_workers)
+    if client is not None:
+        func = _with_context(client, func, priority)
+    items = iter(items)
+    pending = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            for item in items:
+                pending[executor.submit(func, item)] = item
+                if len(pending) >= workers * 2:
+                    break
+            if not pending:
+                return
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    log.debug('Bulk call for {} failed: {}'.format(item, error))
+                    yield BulkResult(item, None, error)
+                else:
+                    yield BulkResult(item, future.result(), None)
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+'''
+    The cmix command: bulk extraction of surveys, project snapshots,
+    respondents, definitions and archives as NDJSON or a directory tree.
+
+    The archives command only starts an export archive build for each survey
+    and writes the archive's metadata (its id and dataLayoutId); it does not
+    wait for the build or download the archive, which get_archive_status
+    reports on once it is ready.
+
+    Credentials are read from the CMIX_USERNAME, CMIX_PASSWORD,
+    CMIX_V2_CLIENT_ID and CMIX_V2_CLIENT_SECRET environment variables. Only
+    the modules a command needs are imported, so the command starts quickly.
+'''
+from __future__ import print_function
+from __future__ import unicode_literals
+import argparse
+import io
+import json
+import logging
+import os
+import sys
+import threading
+
+log = logging.getLogger(__name__)
+
+CREDENTIAL_VARIABLES = ('CMIX_USERNAME', 'CMIX_PASSWORD', 'CMIX_V2_CLIENT_ID', 'CMIX_V2_CLIENT_SECRET')
+
+# commands whose listing already holds each item, so only items given with --id are fetched
+FROM_LISTING = ('surveys', )
+
+
+def _survey(client, survey_id, args):
+    return client.api_get('surveys/{}'.format(survey_id), 'CMIX returned a non-200 response code getting the survey')
+
+
+def _survey_respondents(client, survey_id, args):
+    return client.get_survey_respondents(survey_id, args.respondent_type, not args.test_respondents)
+
+
+def _survey_definition(client, survey_id, args):
+    return client.get_survey_definition(survey_id)
+
+
+def _survey_archive(client, survey_id, args):
+    # starts the build; the archive is downloaded separately once it is ready
+    return client.create_export_archive(survey_id, args.export_type)
+
+
+def _project_snapshot(client, project_id, args):
+    from .project import CmixProject
+    project = CmixProject(client, project_id)
+    return {
+        'project': project.get_project(),
+        'surveys': project.get_surveys(),
+        'sources': project.get_sources(),
+    }
+
+
+# command: (function fetching one item, where its IDs come from)
+COMMANDS = {
+    'surveys': (_survey, 'surveys'),
+    'projects': (_project_snapshot, 'projects'),
+    'respondents': (_survey_respondents, 'surveys'),
+    'definitions': (_survey_definition, 'surveys'),
+    'archives': (_survey_archive, 'surveys'),
+}
+
+
+class NDJSONWriter(object):
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def write(self, command, item_id, data):
+        line = json.dumps({'command': command, 'id': item_id, 'data': data})
+        with self._lock:
+            self.stream.write(line + '\n')
+            self.stream.flush()
+
+
+class DirectoryWriter(object):
+    '''
+        Writes each result to <root>/<command>/<id>.json as it arrives.
+    '''
+    def __init__(self, root):
+        self.root = root
+
+    def write(self, command, item_id, data):
+        directory = os.path.join(self.root, command)
+        if not os.path.isdir(directory):
+            try:
+                os.makedirs(directory)
+            except OSError:
+                if not os.path.isdir(directory):
+                    raise
+        path = os.path.join(directory, '{}.json'.format(item_id))
+        with io.open(path + '.tmp', 'wb') as fh:
+            fh.write(json.dumps(data).encode('utf-8'))
+        os.rename(path + '.tmp', path)
+
+
+class ResumeLog(object):
+    '''
+        Remembers which items have been written, so an interrupted run can be
+        restarted without fetching them again.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.done = set()
+        if path is not None and os.path.exists(path):
+            with io.open(path, 'r', encoding='utf-8') as fh:
+                self.done = set(line.strip() for line in fh if line.strip())
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self.done
+
+    def add(self, key):
+        if self.path is None:
+            return
+        with self._lock:
+            self.done.add(key)
+            with io.open(self.path, 'a', encoding='utf-8') as fh:
+                fh.write('{}\n'.format(key))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(prog='cmix', description='Bulk extraction from the CMIX API.')
+    parser.add_argument(
+        'command', choices=sorted(COMMANDS),
+        help='what to extract; archives only starts an archive build per survey and writes its metadata'
+    )
+    parser.add_argument('--status', action='append', help='survey status to list (repeatable, default LIVE)')
+    parser.add_argument('--status-after', help='only surveys whose status changed after this date')
+    parser.add_argument('--id', action='append', dest='ids', help='survey or project ID to fetch instead of listing')
+    parser.add_argument('--respondent-type', default='COMPLETE')
+    parser.add_argument('--test-respondents', action='store_true', help='fetch test instead of live respondents')
+    parser.add_argument('--export-type', default='CSV')
+    parser.add_argument('--output', help='write one JSON file per item under this directory instead of NDJSON')
+    parser.add_argument('--resume', help='file recording finished items; finished items are skipped')
+    parser.add_argument('--workers', type=int, help='concurrent requests (default: adaptive)')
+    parser.add_argument('--rate-limit', type=float, help='maximum requests per second')
+    parser.add_argument('--test', action='store_true', help='use the CMIX test environment')
+    parser.add_argument('--http2', action='store_true', help='multiplex requests over HTTP/2')
+    parser.add_argument('--verbose', '-v', action='store_true')
+    return parser.parse_args(argv)
+
+
+def make_client(args):
+    from .api import CmixAPI
+    from .error import CmixError
+    from .limits import AdaptiveConcurrencyLimiter, CompositeLimiter, RateLimiter
+
+    missing = [name for name in CREDENTIAL_VARIABLES if not os.environ.get(name)]
+    if missing:
+        raise CmixError('Missing CMIX credentials in the environment: {}'.format(', '.join(missing)))
+    limiters = [AdaptiveConcurrencyLimiter(maximum=args.workers or 32)]
+    if args.rate_limit is not None:
+        limiters.append(RateLimiter(args.rate_limit))
+    client = CmixAPI(
+        username=os.environ['CMIX_USERNAME'],
+        password=os.environ['CMIX_PASSWORD'],
+        client_id=os.environ['CMIX_V2_CLIENT_ID'],
+        client_secret=os.environ['CMIX_V2_CLIENT_SECRET'],
+        test=args.test,
+        limiter=CompositeLimiter(limiters),
+        http2=args.http2
+    )
+    client.authenticate()
+    return client
+
+
+def list_items(client, args, source):
+    '''
+        Yields (id, listing) pairs for the surveys or projects to extract.
+    '''
+    if args.ids:
+        for item_id in args.ids:
+            yield item_id, None
+        return
+    if source == 'projects':
+        listing = client.get_projects()
+    else:
+        extra_params = None
+        if args.status_after:
+            extra_params = ['{}={}'.format(client.SURVEY_PARAMS_STATUS_AFTER, args.status_after)]
+        listing = []
+        for status in args.status or [client.SURVEY_STATUS_LIVE]:
+            listing.extend(client.get_surveys(status, extra_params=extra_params))
+    for item in listing:
+        yield item.get('id'), item
+
+
+def run(args, client, writer, resume):
+    '''
+        Extracts every item for the command and returns the number of failures.
+    '''
+    from .bulk import map_concurrently
+    from .limits import PRIORITY_BATCH
+
+    fetch, source = COMMANDS[args.command]
+    items = ((item_id, listing) for item_id, listing in list_items(client, args, source)
+             if '{}/{}'.format(args.command, item_id) not in resume)
+    if args.command in FROM_LISTING and not args.ids:
+        fetched = ((item, item[1], None) for item in items)
+    else:
+        fetched = map_concurrently(
+            lambda item: fetch(client, item[0], args),
+            items,
+            client=client,
+            max_workers=args.workers,
+            priority=PRIORITY_BATCH
+        )
+    failures = 0
+    for item, data, error in fetched:
+        item_id = item[0]
+        if error is not None:
+            failures += 1
+            log.error('{} {} failed: {}'.format(args.command, item_id, error))
+            continue
+        writer.write(args.command, item_id, data)
+        resume.add('{}/{}'.format(args.command, item_id))
+    return failures
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.WARNING, stream=sys.stderr)
+    from .error import CmixError
+    try:
+        client = make_client(args)
+        writer = DirectoryWriter(args.output) if args.output else NDJSONWriter(sys.stdout)
+        failures = run(args, client, writer, ResumeLog(args.resume))
+    except CmixError as e:
+        log.error('{}'.format(e))
+        return 2
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import array
+import io
+import json
+import mmap
+import os
+import sys
+
+from collections import OrderedDict
+from itertools import chain, compress
+
+from .error import CmixError
+from .export import iter_export_rows
+from .tabulation import _coerce_response, Column, ColumnBuilder, ResponseTable
+
+META_FILE = 'columns.json'
+CODE_TYPE = str('i')
+CHUNK_ROWS = 64 * 1024
+# columns with more distinct values than this are stored value by value
+MAX_DICTIONARY_VALUES = 64 * 1024
+
+
+def _codes_file(position):
+    return 'col_{:05d}.codes'.format(position)
+
+
+def _values_file(position):
+    return 'col_{:05d}.json'.format(position)
+
+
+def _raw_file(position):
+    return 'col_{:05d}.jsonl'.format(position)
+
+
+def _write_json(path, data):
+    with io.open(path, 'wb') as fh:
+        fh.write(json.dumps(data).encode('utf-8'))
+
+
+def _read_json(path):
+    with io.open(path, 'rb') as fh:
+        return json.loads(fh.read().decode('utf-8'))
+
+
+def _flush_codes(directory, builders):
+    for position, builder in enumerate(builders):
+        if not isinstance(builder, ColumnBuilder):
+            continue
+        with io.open(os.path.join(directory, _codes_file(position)), 'ab') as fh:
+            builder.codes.tofile(fh)
+        del builder.codes[:]
+
+
+class RawColumnWriter(object):
+    '''
+        Writes a column one JSON string per row, for columns such as
+        respondent IDs, timestamps or open ends whose distinct values would not
+        fit in memory as a dictionary.
+    '''
+    def __init__(self, path):
+        self._file = io.open(path, 'wb')
+
+    def append(self, value):
+        self._file.write(json.dumps(value).encode('utf-8') + b'\n')
+
+    def close(self):
+        self._file.close()
+
+
+def _spill_column(directory, position, builder, flushed_rows):
+    # rewrite the rows coded so far, on disk and in memory, as raw values
+    writer = RawColumnWriter(os.path.join(directory, _raw_file(position)))
+    codes_path = os.path.join(directory, _codes_file(position))
+    flushed = MappedCodes(codes_path, flushed_rows)
+    try:
+        for code in chain(flushed, builder.codes):
+            writer.append(builder.values[code])
+    finally:
+        flushed.close()
+    os.remove(codes_path)
+    return writer
+
+
+def convert_export(source, directory, data_layout_id=None, delimiter=None, encoding='utf-8'):
+    '''
+        Converts a downloaded export into an on-disk columnar store in
+        directory: one binary file of int32 codes and one JSON dictionary of
+        distinct values per column. Rows are flushed to disk in chunks and
+        columns with more than MAX_DICTIONARY_VALUES distinct values are
+        written row by row instead, so memory use is bounded by the chunk size
+        and the dictionaries of the low-cardinality columns rather than by the
+        size of the export.
+    '''
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    rows = iter_export_rows(source, delimiter=delimiter, encoding=encoding)
+    header = next(rows, None)
+    if header is None:
+        raise CmixError('Export {} is empty.'.format(source))
+    builders = [ColumnBuilder(name) for name in header]
+    for position in range(len(builders)):
+        io.open(os.path.join(directory, _codes_file(position)), 'wb').close()
+    row_count = 0
+    for row in rows:
+        for position, builder in enumerate(builders):
+            builder.append(row[position] if position < len(row) else '')
+            if isinstance(builder, ColumnBuilder) and len(builder.values) > MAX_DICTIONARY_VALUES:
+                builders[position] = _spill_column(directory, position, builder, row_count - len(builder.codes) + 1)
+        row_count += 1
+        if row_count % CHUNK_ROWS == 0:
+            _flush_codes(directory, builders)
+    _flush_codes(directory, builders)
+    raw = []
+    for position, builder in enumerate(builders):
+        if isinstance(builder, ColumnBuilder):
+            _write_json(os.path.join(directory, _values_file(position)), builder.values)
+        else:
+            builder.close()
+            raw.append(position)
+    _write_json(os.path.join(directory, META_FILE), {
+        'dataLayoutId': data_layout_id,
+        'rows': row_count,
+        'byteorder': sys.byteorder,
+        'itemsize': array.array(CODE_TYPE).itemsize,
+        'columns': header,
+        'raw': raw,
+    })
+    return ColumnarStore(directory)
+
+
+class MappedCodes(object):
+    '''
+        A read-only, memory-mapped sequence of column codes. Pages are loaded
+        by the OS on demand and shared between every process reading the file.
+    '''
+    def __init__(self, path, length, swap=False):
+        self.length = length
+        self.swap = swap
+        self.itemsize = array.array(CODE_TYPE).itemsize
+        self._map = None
+        if length:
+            with io.open(path, 'rb') as fh:
+                self._map = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return self.length
+
+    def _decode(self, data):
+        codes = array.array(CODE_TYPE)
+        if hasattr(codes, 'frombytes'):
+            codes.frombytes(data)
+        else:
+            codes.fromstring(data)
+        if self.swap:
+            codes.byteswap()
+        return codes
+
+    def __getitem__(self, position):
+        if position < 0:
+            position += self.length
+        if not 0 <= position < self.length:
+            raise IndexError('column code index out of range')
+        offset = position * self.itemsize
+        return self._decode(self._map[offset:offset + self.itemsize])[0]
+
+    def _chunks(self):
+        step = CHUNK_ROWS * self.itemsize
+        for offset in range(0, self.length * self.itemsize, step):
+            yield self._decode(self._map[offset:offset + step])
+
+    def __iter__(self):
+        return chain.from_iterable(self._chunks())
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+
+
+class RawColumn(object):
+    '''
+        A column stored value by value, read back in a single pass for each
+        query. Such columns can be counted and filtered on but, having no
+        dictionary, not cross-tabulated.
+    '''
+    def __init__(self, name, path, rows):
+        self.name = name
+        self.path = path
+        self.rows = rows
+
+    def __len__(self):
+        return self.rows
+
+    def __iter__(self):
+        with io.open(self.path, 'rb') as fh:
+            for line in fh:
+                yield json.loads(line.decode('utf-8'))
+
+    @property
+    def codes(self):
+        raise CmixError('Column {} has too many distinct values to cross-tabulate.'.format(self.name))
+
+    values = codes
+
+    def lookup(self, wanted):
+        if not isinstance(wanted, (list, tuple, set)):
+            wanted = [wanted]
+        wanted = set('{}'.format(value) for value in wanted)
+        return bytearray(1 if value in wanted else 0 for value in self)
+
+    mask = lookup
+
+    def counts(self, mask=None):
+        values = iter(self) if mask is None else compress(self, mask)
+        result = OrderedDict()
+        for value in values:
+            if value != '':
+                result[value] = result.get(value, 0) + 1
+        return OrderedDict((_coerce_response(value), count) for value, count in result.items())
+
+
+class ColumnarStore(object):
+    '''
+        Reads a store written by convert_export lazily, one column at a time.
+    '''
+    def __init__(self, directory):
+        meta_path = os.path.join(directory, META_FILE)
+        if not os.path.exists(meta_path):
+            raise CmixError('{} is not a columnar export store.'.format(directory))
+        meta = _read_json(meta_path)
+        self.directory = directory
+        self.data_layout_id = meta['dataLayoutId']
+        self.rows = meta['rows']
+        self.columns = meta['columns']
+        self._raw = set(meta.get('raw', []))
+        self._swap = meta['byteorder'] != sys.byteorder
+        if meta['itemsize'] != array.array(CODE_TYPE).itemsize:
+            raise CmixError('Columnar store {} was written with an incompatible code size.'.format(directory))
+        self._positions = dict((name, position) for position, name in enumerate(self.columns))
+
+    def __len__(self):
+        return self.rows
+
+    def column(self, name):
+        position = self._positions.get(name)
+        if position is None:
+            raise CmixError('Column {} is not in the columnar store {}.'.format(name, self.directory))
+        if position in self._raw:
+            return RawColumn(name, os.path.join(self.directory, _raw_file(position)), self.rows)
+        values = _read_json(os.path.join(self.directory, _values_file(position)))
+        codes = MappedCodes(os.path.join(self.directory, _codes_file(position)), self.rows, swap=self._swap)
+        return Column(name, values, codes)
+
+    def table(self, usecols=None, index=None):
+        '''
+            Returns a ResponseTable over the memory-mapped columns, loading only
+            the columns named in usecols.
+        '''
+        names = self.columns if usecols is None else [name for name in self.columns if name in usecols]
+        return ResponseTable([self.column(name) for name in names], index=index)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import threading
+
+from collections import Counter
+
+from .error import CmixError
+
+
+class RespondentCounter(object):
+    '''
+        Keeps running respondent counts for one survey, by source and by
+        termination code, and serves them from memory.
+
+        Each refresh only aggregates respondents that have not been counted
+        yet. When cursor_param is given it is sent as an extra url param with
+        the highest respondent ID seen so far, so CMIX only returns newer
+        respondents; without it the list is re-read but only new respondents
+        are aggregated, so every refresh costs O(survey size) in transfer and
+        the set of counted IDs kept to tell new respondents apart grows with
+        the survey. With a cursor no IDs are kept.
+
+        Respondents are told apart by ID_FIELD; a respondent without one
+        raises a CmixError rather than being miscounted.
+    '''
+    ID_FIELD = 'id'
+    SOURCE_FIELD = 'sourceId'
+    TERMINATION_CODE_FIELD = 'terminationCodeId'
+
+    def __init__(self, client, survey_id, respondent_type='COMPLETE', live=True, cursor_param=None):
+        self.client = client
+        self.survey_id = survey_id
+        self.respondent_type = respondent_type
+        self.live = live
+        self.cursor_param = cursor_param
+        self.cursor = None
+        self.total = 0
+        self._by_source = Counter()
+        self._by_termination_code = Counter()
+        self._seen = set()
+        self._source_names = None
+        self._termination_code_names = None
+        self._lock = threading.Lock()
+
+    def _extra_params(self):
+        if self.cursor_param is None or self.cursor is None:
+            return None
+        return ['{}={}'.format(self.cursor_param, self.cursor)]
+
+    def refresh(self):
+        '''
+            Fetches respondents since the last refresh, adds them to the counts
+            and returns how many new respondents were counted.
+        '''
+        respondents = self.client.get_survey_respondents(
+            self.survey_id,
+            self.respondent_type,
+            self.live,
+            extra_params=self._extra_params()
+        )
+        for respondent in respondents:
+            if respondent.get(self.ID_FIELD) is None:
+                raise CmixError('CMIX survey {} returned a respondent without an {}: {}'.format(
+                    self.survey_id, self.ID_FIELD, respondent
+                ))
+        added = 0
+        with self._lock:
+            since = self.cursor
+            for respondent in respondents:
+                respondent_id = respondent[self.ID_FIELD]
+                if not self._is_new(respondent_id, since):
+                    continue
+                self._by_source[respondent.get(self.SOURCE_FIELD)] += 1
+                self._by_termination_code[respondent.get(self.TERMINATION_CODE_FIELD)] += 1
+                if self.cursor is None or respondent_id > self.cursor:
+                    self.cursor = respondent_id
+                added += 1
+            self.total += added
+        return added
+
+    def _is_new(self, respondent_id, since):
+        if self.cursor_param is not None:
+            # with a cursor, everything up to it has been counted already
+            return since is None or respondent_id > since
+        if respondent_id in self._seen:
+            return False
+        self._seen.add(respondent_id)
+        return True
+
+    def refresh_labels(self):
+        sources = self.client.get_survey_sources(self.survey_id)
+        termination_codes = self.client.get_survey_termination_codes(self.survey_id)
+        self._source_names = dict((source.get('id'), source.get('name')) for source in sources)
+        self._termination_code_names = dict((code.get('id'), code.get('name')) for code in termination_codes)
+
+    def _labelled(self, counts, names):
+        labelled = Counter()
+        with self._lock:
+            for key, count in counts.items():
+                # sources or codes sharing a name are added together
+                labelled[names.get(key, key)] += count
+        return dict(labelled)
+
+    def counts_by_source(self):
+        if self._source_names is None:
+            self.refresh_labels()
+        return self._labelled(self._by_source, self._source_names)
+
+    def counts_by_termination_code(self):
+        if self._termination_code_names is None:
+            self.refresh_labels()
+        return self._labelled(self._by_termination_code, self._termination_code_names)
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+
+from collections import namedtuple
+from contextlib import contextmanager
+
+from .bulk import map_concurrently
+
+log = logging.getLogger(__name__)
+
+SHARD_PENDING = 'pending'
+SHARD_LEASED = 'leased'
+SHARD_DONE = 'done'
+
+Lease = namedtuple('Lease', ['shard_id', 'items', 'token', 'expires'])
+
+SCHEMA = '''
+    CREATE TABLE IF NOT EXISTS shards (
+        id INTEGER PRIMARY KEY,
+        crawl TEXT NOT NULL,
+        items TEXT NOT NULL,
+        state TEXT NOT NULL,
+        worker TEXT,
+        token TEXT,
+        expires REAL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        done INTEGER NOT NULL DEFAULT 0,
+        failed INTEGER NOT NULL DEFAULT 0
+    )
+'''
+
+
+class CrawlCoordinator(object):
+    '''
+        Splits the surveys to crawl into shards and hands them out to workers
+        on any number of nodes through leases kept in a SQLite database, which
+        can live on a shared filesystem with working file locks. A lease that isn't renewed or
+        completed within lease_seconds (because its worker died) expires and
+        the shard is handed to the next worker asking for one.
+
+        Expiry uses wall-clock time, so the nodes' clocks need to agree to
+        within a small fraction of lease_seconds.
+    '''
+    def __init__(self, path, crawl='default', shard_size=50, lease_seconds=300, busy_timeout=30):
+        self.path = path
+        self.crawl = crawl
+        self.shard_size = shard_size
+        self.lease_seconds = lease_seconds
+        self.busy_timeout = busy_timeout
+        with self._transaction() as db:
+            db.execute(SCHEMA)
+
+    @contextmanager
+    def _transaction(self):
+        # a connection per operation, so coordinators can be shared by threads
+        db = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+        try:
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                yield db
+            except Exception:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+        finally:
+            db.close()
+
+    def plan(self, item_ids):
+        '''
+            Shards item_ids unless this crawl has been planned already, so every
+            node can call plan at start-up. Returns the number of shards.
+        '''
+        with self._transaction() as db:
+            planned = db.execute('SELECT COUNT(*) FROM shards WHERE crawl = ?', (self.crawl, )).fetchone()[0]
+            if planned:
+                return planned
+            item_ids = list(item_ids)
+            shards = [item_ids[start:start + self.shard_size] for start in range(0, len(item_ids), self.shard_size)]
+            db.executemany(
+                'INSERT INTO shards (crawl, items, state) VALUES (?, ?, ?)',
+                [(self.crawl, json.dumps(shard), SHARD_PENDING) for shard in shards]
+            )
+            return len(shards)
+
+    def lease(self, worker_id):
+        '''
+            Leases the next pending or expired shard to worker_id, or returns
+            None when every shard is done or leased.
+        '''
+        now = time.time()
+        with self._transaction() as db:
+            row = db.execute(
+                'SELECT id, items FROM shards WHERE crawl = ? AND '
+                '(state = ? OR (state = ? AND expires < ?)) ORDER BY attempts, id LIMIT 1',
+                (self.crawl, SHARD_PENDING, SHARD_LEASED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            token = uuid.uuid4().hex
+            expires = now + self.lease_seconds
+            db.execute(
+                'UPDATE shards SET state = ?, worker = ?, token = ?, expires = ?, attempts = attempts + 1 WHERE id = ?',
+                (SHARD_LEASED, worker_id, token, expires, row[0])
+            )
+        return Lease(row[0], json.loads(row[1]), token, expires)
+
+    def _update_lease(self, lease, sql, params):
+        with self._transaction() as db:
+            cursor = db.execute(sql + ' WHERE id = ? AND token = ? AND state = ?', params + (
+                lease.shard_id, lease.token, SHARD_LEASED
+            ))
+            return cursor.rowcount == 1
+
+    def renew(self, lease):
+        '''
+            Extends the lease; returns None if it was lost to another worker.
+        '''
+        expires = time.time() + self.lease_seconds
+        if not self._update_lease(lease, 'UPDATE shards SET expires = ?', (expires, )):
+            return None
+        return lease._replace(expires=expires)
+
+    def complete(self, lease, done, failed=0):
+        '''
+            Marks the shard done; returns False if the lease had been lost, in
+            which case another worker owns the shard.
+        '''
+        return self._update_lease(
+            lease,
+            'UPDATE shards SET state = ?, token = NULL, done = ?, failed = ?',
+            (SHARD_DONE, done, failed)
+        )
+
+    def release(self, lease):
+        '''
+            Hands an unfinished shard back to be leased again.
+        '''
+        return self._update_lease(lease, 'UPDATE shards SET state = ?, token = NULL', (SHARD_PENDING, ))
+
+    def progress(self):
+        '''
+            Crawl progress over all nodes: shard counts by state, the number of
+            items in all shards and in finished shards done and failed, and the
+            workers holding live leases.
+        '''
+        now = time.time()
+        progress = {
+            'shards': 0, SHARD_PENDING: 0, SHARD_LEASED: 0, SHARD_DONE: 0, 'items': 0, 'items_done': 0, 'items_failed': 0
+        }
+        workers = set()
+        with self._transaction() as db:
+            rows = db.execute(
+                'SELECT state, items, worker, expires, done, failed FROM shards WHERE crawl = ?', (self.crawl, )
+            ).fetchall()
+        for state, items, worker, expires, done, failed in rows:
+            if state == SHARD_LEASED and expires < now:
+                state = SHARD_PENDING
+            progress['shards'] += 1
+            progress[state] += 1
+            progress['items'] += len(json.loads(items))
+            progress['items_done'] += done
+            progress['items_failed'] += failed
+            if state == SHARD_LEASED:
+                workers.add(worker)
+        progress['workers'] = sorted(workers)
+        return progress
+
+
+def default_worker_id():
+    return '{}-{}'.format(socket.gethostname(), os.getpid())
+
+
+class LeaseHeartbeat(object):
+    '''
+        Renews a lease from a thread of its own every third of lease_seconds,
+        however long the shard's fetches take, until stopped or the lease is
+        lost to another worker.
+    '''
+    def __init__(self, coordinator, lease):
+        self.coordinator = coordinator
+        self.lease = lease
+        self.lost = False
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _run(self):
+        interval = self.coordinator.lease_seconds / 3.0
+        while not self._stopped.wait(interval):
+            try:
+                lease = self.coordinator.renew(self.lease)
+            except sqlite3.Error as e:
+                # the lease is still good for a while, so try again next beat
+                log.warning('Could not renew the lease on shard {}: {}'.format(self.lease.shard_id, e))
+                continue
+            if lease is None:
+                self.lost = True
+                return
+            self.lease = lease
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+
+class CrawlWorker(object):
+    '''
+        Leases shards from a CrawlCoordinator until none are left, calling
+        fetch(client, item_id) for each item of a shard concurrently and
+        on_result(BulkResult) with every outcome. Run one per node, or several
+        per node against separate clients.
+
+            coordinator = CrawlCoordinator('/shared/crawl.db', crawl='2020-06-01')
+            coordinator.plan(survey['id'] for survey in cmix.get_surveys('LIVE'))
+            CrawlWorker(coordinator, cmix, lambda client, survey_id: client.get_survey_definition(survey_id),
+                        on_result=store).run()
+    '''
+    def __init__(self, coordinator, client, fetch, on_result=None, worker_id=None, max_workers=None, priority=None):
+        self.coordinator = coordinator
+        self.client = client
+        self.fetch = fetch
+        self.on_result = on_result
+        self.worker_id = worker_id or default_worker_id()
+        self.max_workers = max_workers
+        self.priority = priority
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+
+    def run_shard(self, lease):
+        '''
+            Crawls one leased shard, renewing the lease while it runs. Returns
+            the number of items done and failed, or None if the lease was lost.
+        '''
+        done = failed = 0
+        results = map_concurrently(
+            lambda item_id: self.fetch(self.client, item_id),
+            lease.items,
+            client=self.client,
+            max_workers=self.max_workers,
+            priority=self.priority
+        )
+        heartbeat = LeaseHeartbeat(self.coordinator, lease)
+        try:
+            for result in results:
+                if heartbeat.lost:
+                    log.warning('Worker {} lost its lease on a shard.'.format(self.worker_id))
+                    return None
+                if result.error is None:
+                    done += 1
+                else:
+                    failed += 1
+                if self.on_result is not None:
+                    self.on_result(result)
+        finally:
+            heartbeat.stop()
+        if not self.coordinator.complete(heartbeat.lease, done, failed):
+            log.warning('Worker {} finished shard {} after losing its lease.'.format(self.worker_id, lease.shard_id))
+            return None
+        return done, failed
+
+    def run(self, max_shards=None):
+        '''
+            Crawls shards until none are left (or max_shards have been crawled)
+            and returns the number of shards this worker completed.
+        '''
+        completed = 0
+        while not self._stopped and (max_shards is None or completed < max_shards):
+            lease = self.coordinator.lease(self.worker_id)
+            if lease is None:
+                break
+            try:
+                if self.run_shard(lease) is not None:
+                    completed += 1
+            except BaseException:
+                self.coordinator.release(lease)
+                raise
+        return completed
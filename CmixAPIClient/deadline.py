@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import threading
+
+from .error import CmixCancelledError, CmixTimeoutError
+from .limits import clock
+
+
+class Deadline(object):
+    '''
+        A time limit for a whole operation or job, which can also be cancelled
+        from another thread. Entered with CmixAPI.deadline, it bounds the
+        timeouts of every request made inside it and stops new requests once it
+        has passed or been cancelled.
+    '''
+    def __init__(self, seconds=None):
+        self.expires = clock() + seconds if seconds is not None else None
+        self._cancelled = threading.Event()
+        # a condition appears once per thread waiting on it
+        self._waiters = []
+        self._waiters_lock = threading.Lock()
+
+    def remaining(self):
+        if self.expires is None:
+            return None
+        return max(0, self.expires - clock())
+
+    def cancel(self):
+        self._cancelled.set()
+        with self._waiters_lock:
+            waiters = set(self._waiters)
+        for condition in waiters:
+            with condition:
+                condition.notify_all()
+
+    def add_waiter(self, condition):
+        '''
+            Has cancel() wake the threads waiting on condition, e.g. a limiter
+            queue; see CmixAPIClient.limits.wait_within.
+        '''
+        with self._waiters_lock:
+            self._waiters.append(condition)
+
+    def remove_waiter(self, condition):
+        with self._waiters_lock:
+            self._waiters.remove(condition)
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def expired(self):
+        return self.expires is not None and clock() >= self.expires
+
+    def check(self):
+        if self.cancelled:
+            raise CmixCancelledError('The CMIX operation was cancelled.')
+        if self.expired:
+            raise CmixTimeoutError('The CMIX operation exceeded its deadline.')
+
+    def wait(self, seconds):
+        '''
+            Sleeps for up to seconds, waking early if cancelled; returns True
+            when the deadline was cancelled.
+        '''
+        remaining = self.remaining()
+        if remaining is not None:
+            seconds = min(seconds, remaining)
+        return self._cancelled.wait(seconds)
+
+
+def tightest(deadlines):
+    remaining = [deadline.remaining() for deadline in deadlines if deadline.expires is not None]
+    return min(remaining) if remaining else None
@@ -1,10 +1,145 @@
 # -*- coding: utf-8 -*-
 from __future__ import unicode_literals
 
+# how much of a response body or submitted document ends up in a message
+MAX_MESSAGE_DETAIL = 1024
+
+try:
+    string_types = basestring
+except NameError:
+    string_types = str
+
+# methods that can be sent twice without doing the work twice
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+def _truncate(text, limit=MAX_MESSAGE_DETAIL):
+    if len(text) <= limit:
+        return text
+    return '{}... [{} more characters]'.format(text[:limit], len(text) - limit)
+
+
+def _response_body(response, limit=MAX_MESSAGE_DETAIL):
+    # only decode the start of the body, which may be many megabytes
+    content = getattr(response, 'content', None)
+    if isinstance(content, bytes):
+        body = content[:limit + 1].decode('utf-8', 'replace')
+        if len(content) > limit:
+            return '{}... [{} more bytes]'.format(body[:limit], len(content) - limit)
+        return body
+    return _truncate('{}'.format(getattr(response, 'text', '')), limit)
+
 
 class CmixError(Exception):
     '''
         This base error will help determine when CMIX returns a bad response or
         otherwise raises an exception while using the API.
+
+        Errors raised for a response keep a reference to it along with its
+        status code and URL. The message, including the start of the response
+        body and any detail such as submitted XML, is only formatted when the
+        error is turned into a string, and is truncated.
+
+        retryable says whether sending the request again may succeed. Transient
+        failures are only retryable for idempotent methods (or when the method
+        isn't known), since a POST that timed out or failed on the server may
+        still have done its work; failures that mean the request was never
+        processed, such as throttling, are retryable for any method.
     '''
+    # the failure may go away on its own
+    transient = False
+    # the request was certainly not processed
+    unprocessed = False
+
+    def __init__(self, message='', response=None, status_code=None, url=None, detail=None, method=None):
+        super(CmixError, self).__init__(message)
+        self.message = message
+        self.response = response
+        self.status_code = status_code if status_code is not None else getattr(response, 'status_code', None)
+        self.url = url if url is not None else getattr(response, 'url', None)
+        self.detail = detail
+        if method is None:
+            method = getattr(getattr(response, 'request', None), 'method', None)
+        self.method = method if isinstance(method, string_types) else None
+        self._formatted = None
+
+    @property
+    def retryable(self):
+        if not self.transient:
+            return False
+        return self.unprocessed or self.method is None or self.method.upper() in IDEMPOTENT_METHODS
+
+    @classmethod
+    def from_response(cls, response, message, detail=None):
+        '''
+            Returns an error of the subclass matching the response's status code.
+        '''
+        error_class = error_class_for_status(getattr(response, 'status_code', None))
+        if not issubclass(error_class, cls):
+            error_class = cls
+        return error_class(message, response=response, detail=detail)
+
+    def __str__(self):
+        if self._formatted is None:
+            message = self.message
+            if self.response is not None:
+                message = '{}: {} and error {}'.format(message, self.status_code, _response_body(self.response))
+            if self.detail is not None:
+                message = '{} when sent: {}'.format(message, _truncate('{}'.format(self.detail)))
+            self._formatted = message
+        return self._formatted
+
+
+class CmixAuthError(CmixError):
     pass
+
+
+class CmixNotFoundError(CmixError):
+    pass
+
+
+class CmixThrottledError(CmixError):
+    transient = True
+    unprocessed = True
+
+
+class CmixServerError(CmixError):
+    transient = True
+
+
+class CmixTimeoutError(CmixError):
+    transient = True
+
+
+class CmixConnectionError(CmixError):
+    '''
+        CMIX could not be reached, or the connection failed mid-request.
+    '''
+    transient = True
+
+
+class CmixCancelledError(CmixError):
+    pass
+
+
+class CmixCircuitOpenError(CmixError):
+    '''
+        Raised by a caller-side circuit breaker that refuses requests to a host
+        that has been failing; retry once the circuit closes.
+    '''
+    transient = True
+    unprocessed = True
+
+
+def error_class_for_status(status_code):
+    if status_code in (401, 403):
+        return CmixAuthError
+    if status_code == 404:
+        return CmixNotFoundError
+    if status_code == 429:
+        return CmixThrottledError
+    if status_code in (408, 504):
+        return CmixTimeoutError
+    if isinstance(status_code, int) and status_code >= 500:
+        return CmixServerError
+    return CmixError
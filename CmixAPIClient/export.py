@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import csv
+import io
+import sys
+import zipfile
+
+from .error import CmixError
+
+PY2 = sys.version_info[0] == 2
+
+EXPORT_EXTENSIONS = ('.csv', '.tsv', '.txt', '.dat')
+DELIMITERS = ',\t;|'
+
+
+def _open_export(source):
+    if hasattr(source, 'read'):
+        return source, False
+    if zipfile.is_zipfile(source):
+        archive = zipfile.ZipFile(source)
+        names = [name for name in archive.namelist() if name.lower().endswith(EXPORT_EXTENSIONS)]
+        if not names:
+            raise CmixError('Export archive {} does not contain a delimited data file.'.format(source))
+        return archive.open(names[0]), True
+    return io.open(source, 'rb'), True
+
+
+def iter_export_rows(source, delimiter=None, encoding='utf-8'):
+    '''
+        Yields the rows of a delimited export downloaded from a CMIX archive,
+        header row first. Blank lines are skipped.
+
+        source can be a path to the downloaded archive (zipped or not) or a
+        binary file object. The delimiter is sniffed when it is not given.
+    '''
+    raw, should_close = _open_export(source)
+    wrapper = io.TextIOWrapper(raw, encoding=encoding, newline='')
+    try:
+        lines = wrapper
+        if delimiter is None:
+            sample = wrapper.read(64 * 1024)
+            try:
+                delimiter = csv.Sniffer().sniff(sample, delimiters=DELIMITERS).delimiter
+            except csv.Error:
+                delimiter = ','
+            lines = _chain(sample, wrapper)
+        for row in _reader(lines, delimiter):
+            if row:
+                yield row
+    finally:
+        if should_close:
+            raw.close()
+        else:
+            # don't let the wrapper close a file object the caller still owns
+            wrapper.detach()
+
+
+def _reader(lines, delimiter):
+    if not PY2:
+        return csv.reader(lines, delimiter=delimiter)
+    # python 2's csv module only reads byte strings
+    rows = csv.reader((line.encode('utf-8') for line in lines), delimiter=str(delimiter))
+    return ([cell.decode('utf-8') for cell in row] for row in rows)
+
+
+def _chain(sample, text):
+    # put the sniffed sample back in front of the rest of the stream
+    lines = io.StringIO(sample, newline='').readlines()
+    if lines and lines[-1].endswith('\r'):
+        # the sample may have ended between the \r and \n of a CRLF
+        following = text.read(1)
+        if following == '\n':
+            lines[-1] += following
+        elif following:
+            lines.append(following if following == '\r' else following + text.readline())
+    elif lines and not lines[-1].endswith('\n'):
+        lines[-1] += text.readline()
+    for line in lines:
+        yield line
+    for line in text:
+        yield line
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import logging
+import threading
+
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+
+from .limits import clock
+
+log = logging.getLogger(__name__)
+
+
+def _close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def _start_thread(function, *args):
+    future = Future()
+
+    def run():
+        future.set_running_or_notify_cancel()
+        try:
+            result = function(*args)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+    return future
+
+
+class HedgePolicy(object):
+    '''
+        Hedges idempotent GETs: when a response has not arrived after the
+        host's percentile latency, an identical request is sent and whichever
+        answers first is used. The slower request's response is closed when it
+        arrives.
+
+        Hedges only start once min_samples latencies have been seen for the
+        host, and never exceed max_ratio of the requests sent through the
+        policy. Hand a policy to CmixAPI as the hedge_policy kwarg.
+
+        Each primary request runs on a thread of its own, so the policy never
+        caps how many GETs callers have in flight; max_workers only bounds the
+        hedges.
+    '''
+    def __init__(self, percentile=95, min_delay=0.05, max_ratio=0.05, window=200, min_samples=20, max_workers=16):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_ratio = max_ratio
+        self.window = window
+        self.min_samples = min_samples
+        self.requests = 0
+        self.hedges = 0
+        self._latencies = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def record(self, host, elapsed):
+        with self._lock:
+            latencies = self._latencies.get(host)
+            if latencies is None:
+                latencies = self._latencies[host] = deque(maxlen=self.window)
+            latencies.append(elapsed)
+
+    def delay(self, host):
+        with self._lock:
+            latencies = sorted(self._latencies.get(host, ()))
+        if len(latencies) < self.min_samples:
+            return None
+        position = min(len(latencies) - 1, int(len(latencies) * self.percentile / 100.0))
+        return max(self.min_delay, latencies[position])
+
+    def _has_budget(self):
+        return self.hedges + 1 <= self.requests * self.max_ratio
+
+    def _take_budget(self):
+        with self._lock:
+            if not self._has_budget():
+                return False
+            self.hedges += 1
+            return True
+
+    def _timed(self, host, send):
+        started = clock()
+        response = send()
+        self.record(host, clock() - started)
+        return response
+
+    def execute(self, host, send):
+        '''
+            Calls send(), hedging it with a second call if it is slow, and
+            returns the first successful response.
+        '''
+        with self._lock:
+            self.requests += 1
+            budget = self._has_budget()
+        delay = self.delay(host)
+        if delay is None or not budget:
+            return self._timed(host, send)
+        primary = _start_thread(self._timed, host, send)
+        if wait([primary], timeout=delay).done or not self._take_budget():
+            return primary.result()
+        log.debug('Hedging request to {} after {:.3f}s'.format(host, delay))
+        hedge = self._executor.submit(send)
+        done, _ = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        winner = primary if primary in done else hedge
+        loser = hedge if winner is primary else primary
+        if winner.exception() is not None:
+            # the first answer was an error, so give the other request its chance
+            return loser.result()
+        if not loser.cancel():
+            loser.add_done_callback(_close_response)
+        return winner.result()
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False)
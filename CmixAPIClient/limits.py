@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import threading
+import time
+
+from collections import deque
+
+from .error import CmixError
+
+# time.monotonic is not available on python 2
+clock = getattr(time, 'monotonic', time.time)
+
+
+def wait_within(condition, deadlines=(), timeout=None):
+    '''
+        condition.wait(timeout) for a held condition, cut short by the tightest
+        of deadlines and woken as soon as any of them is cancelled. Raises the
+        deadline's CmixTimeoutError or CmixCancelledError once one has passed
+        or been cancelled.
+    '''
+    for deadline in deadlines:
+        deadline.add_waiter(condition)
+    try:
+        for deadline in deadlines:
+            deadline.check()
+        limits = [deadline.remaining() for deadline in deadlines if deadline.expires is not None]
+        if timeout is not None:
+            limits.append(timeout)
+        condition.wait(min(limits) if limits else None)
+        for deadline in deadlines:
+            deadline.check()
+    finally:
+        for deadline in deadlines:
+            deadline.remove_waiter(condition)
+
+
+def acquire_within(limiter, host, priority, deadlines):
+    '''
+        Acquires limiter, bounded by deadlines. Limiters that don't take a
+        deadlines argument still work when there are no deadlines.
+    '''
+    if deadlines:
+        limiter.acquire(host, priority, deadlines)
+    else:
+        limiter.acquire(host, priority)
+
+
+class ConcurrencyLimiter(object):
+    '''
+        Caps the number of requests in flight. Limiters are handed to CmixAPI
+        as the limiter kwarg: acquire(host, priority, deadlines) is called
+        before every request and release(host, status_code, elapsed) after it,
+        with status_code None when the request raised and elapsed None when it
+        was never sent. Waits for a slot end with the request's deadlines
+        (see wait_within); deadlines is only passed when there are some.
+    '''
+    def __init__(self, max_concurrent):
+        self.max_concurrent = max_concurrent
+        self.maximum = max_concurrent
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, host, priority=None, deadlines=()):
+        with self._condition:
+            while self.in_flight >= self.max_concurrent:
+                wait_within(self._condition, deadlines)
+            self.in_flight += 1
+
+    def release(self, host, status_code, elapsed):
+        with self._condition:
+            self.in_flight -= 1
+            # a single woken waiter could be one whose deadline just ran out
+            self._condition.notify_all()
+
+
+class RateLimiter(object):
+    '''
+        A token bucket allowing rate requests per second on average, with
+        bursts of up to burst requests.
+    '''
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = burst if burst is not None else max(1, int(rate))
+        self._tokens = float(self.burst)
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def _wait_time(self):
+        with self._lock:
+            now = clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self, host, priority=None, deadlines=()):
+        wait = self._wait_time()
+        if wait <= 0:
+            return
+        sleeping = threading.Condition()
+        with sleeping:
+            while wait > 0:
+                wait_within(sleeping, deadlines, wait)
+                wait = self._wait_time()
+
+    def release(self, host, status_code, elapsed):
+        pass
+
+
+class CompositeLimiter(object):
+    '''
+        Applies several limiters to the same request, acquiring them in order
+        and releasing them in reverse.
+    '''
+    def __init__(self, limiters):
+        self.limiters = list(limiters)
+
+    @property
+    def maximum(self):
+        maximums = [limiter.maximum for limiter in self.limiters if getattr(limiter, 'maximum', None) is not None]
+        return min(maximums) if maximums else None
+
+    def acquire(self, host, priority=None, deadlines=()):
+        acquired = []
+        try:
+            for limiter in self.limiters:
+                acquire_within(limiter, host, priority, deadlines)
+                acquired.append(limiter)
+        except BaseException:
+            for limiter in reversed(acquired):
+                limiter.release(host, None, None)
+            raise
+
+    def release(self, host, status_code, elapsed):
+        for limiter in reversed(self.limiters):
+            limiter.release(host, status_code, elapsed)
+
+
+class _HostWindow(object):
+    def __init__(self, limit):
+        self.limit = float(limit)
+        self.in_flight = 0
+        self.baseline = None
+        self.last_decrease = None
+        self.condition = threading.Condition()
+
+
+class AdaptiveConcurrencyLimiter(object):
+    '''
+        An AIMD limiter keeping a separate in-flight limit per CMIX host.
+
+        Each successful, fast response raises the host's limit by 1/limit (about
+        one extra slot per round of requests); a throttled (429, 503, 504),
+        failed or slow response multiplies it by backoff. A response is slow
+        when it takes longer than latency_target, or, without a target, more
+        than tolerance times the host's smoothed latency, a moving average of
+        every answered request, so only a sharp rise counts. Decreases happen
+        at most once per round trip so a burst of errors from one window only
+        counts once.
+    '''
+    THROTTLE_CODES = (429, 503, 504)
+
+    def __init__(self, initial=4, minimum=1, maximum=64, backoff=0.5, latency_target=None, tolerance=2.0, smoothing=0.1):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.latency_target = latency_target
+        self.tolerance = tolerance
+        self.smoothing = smoothing
+        self._hosts = {}
+        self._lock = threading.Lock()
+
+    def _window(self, host):
+        with self._lock:
+            window = self._hosts.get(host)
+            if window is None:
+                window = self._hosts[host] = _HostWindow(self.initial)
+            return window
+
+    def limit(self, host):
+        return int(self._window(host).limit)
+
+    def acquire(self, host, priority=None, deadlines=()):
+        window = self._window(host)
+        with window.condition:
+            while window.in_flight >= int(window.limit):
+                wait_within(window.condition, deadlines)
+            window.in_flight += 1
+
+    def _congested(self, window, status_code, elapsed):
+        if status_code is None or status_code in self.THROTTLE_CODES or status_code >= 500:
+            return True
+        if self.latency_target is not None:
+            return elapsed > self.latency_target
+        return window.baseline is not None and elapsed > window.baseline * self.tolerance
+
+    def release(self, host, status_code, elapsed):
+        window = self._window(host)
+        with window.condition:
+            window.in_flight -= 1
+            window.condition.notify_all()
+            if elapsed is None:
+                # never sent, so it says nothing about the host
+                return
+            now = clock()
+            if self._congested(window, status_code, elapsed):
+                if window.last_decrease is None or now - window.last_decrease > elapsed:
+                    window.limit = max(self.minimum, window.limit * self.backoff)
+                    window.last_decrease = now
+            else:
+                window.limit = min(self.maximum, window.limit + 1.0 / window.limit)
+            if status_code is not None:
+                # slow responses move the baseline too, so a lasting shift in
+                # latency stops counting as congestion once the baseline catches up
+                if window.baseline is None:
+                    window.baseline = elapsed
+                else:
+                    window.baseline += self.smoothing * (elapsed - window.baseline)
+
+
+PRIORITY_INTERACTIVE = 'interactive'
+PRIORITY_NORMAL = 'normal'
+PRIORITY_BATCH = 'batch'
+
+DEFAULT_PRIORITY_WEIGHTS = {
+    PRIORITY_INTERACTIVE: 16,
+    PRIORITY_NORMAL: 4,
+    PRIORITY_BATCH: 1,
+}
+
+
+class PriorityScheduler(object):
+    '''
+        Shares max_concurrent request slots (usually the size of the shared
+        connection pool) between priority classes with weighted fair queuing.
+
+        While requests are queued, each free slot goes to the class with the
+        lowest virtual finish time, and every grant advances a class by
+        1/weight. With the default weights an interactive request waits behind
+        at most a few batch requests however long the batch queue is, while
+        batch traffic is never starved. A class that was idle rejoins at the
+        current virtual time so it cannot save up credit.
+
+        weights override the default weight of the classes they name; the
+        other default classes keep theirs, so requests of the client's
+        priorities always have a queue. Requests of an unknown class are
+        queued as default_priority.
+
+        An optional rate_limiter is applied after a slot is granted, so tokens
+        are handed out in priority order too.
+    '''
+    def __init__(self, max_concurrent, weights=None, default_priority=PRIORITY_NORMAL, rate_limiter=None):
+        self.maximum = max_concurrent
+        self.weights = dict(DEFAULT_PRIORITY_WEIGHTS)
+        self.weights.update(weights or {})
+        if default_priority not in self.weights:
+            raise CmixError('The default priority {} has no weight.'.format(default_priority))
+        self.default_priority = default_priority
+        self.rate_limiter = rate_limiter
+        self.in_flight = 0
+        self._order = sorted(self.weights, key=lambda name: -self.weights[name])
+        self._queues = dict((name, deque()) for name in self.weights)
+        self._virtual_time = dict((name, 0.0) for name in self.weights)
+        self._virtual_now = 0.0
+        self._granted = set()
+        self._condition = threading.Condition()
+
+    def queued(self, priority):
+        with self._condition:
+            return len(self._queues[priority])
+
+    def _dispatch(self):
+        while self.in_flight < self.maximum:
+            active = [name for name in self._order if self._queues[name]]
+            if not active:
+                break
+            name = min(active, key=lambda active_name: self._virtual_time[active_name] + 1.0 / self.weights[active_name])
+            self._virtual_now = self._virtual_time[name]
+            self._virtual_time[name] += 1.0 / self.weights[name]
+            self._granted.add(self._queues[name].popleft())
+            self.in_flight += 1
+        self._condition.notify_all()
+
+    def _wait_for_grant(self, name, ticket, deadlines):
+        try:
+            while ticket not in self._granted:
+                wait_within(self._condition, deadlines)
+        except BaseException:
+            if ticket in self._granted:
+                # granted just as the deadline ran out, so pass the slot on
+                self._granted.remove(ticket)
+                self.in_flight -= 1
+                self._dispatch()
+            else:
+                self._queues[name].remove(ticket)
+            raise
+        self._granted.remove(ticket)
+
+    def acquire(self, host, priority=None, deadlines=()):
+        name = priority if priority in self.weights else self.default_priority
+        ticket = object()
+        with self._condition:
+            if not self._queues[name]:
+                self._virtual_time[name] = max(self._virtual_time[name], self._virtual_now)
+            self._queues[name].append(ticket)
+            self._dispatch()
+            self._wait_for_grant(name, ticket, deadlines)
+        if self.rate_limiter is not None:
+            try:
+                acquire_within(self.rate_limiter, host, priority, deadlines)
+            except BaseException:
+                self.release(host, None, None)
+                raise
+
+    def release(self, host, status_code, elapsed):
+        with self._condition:
+            self.in_flight -= 1
+            self._dispatch()
@@ -0,0 +1,109 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import logging
+import multiprocessing
+
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from .bulk import BulkResult, map_concurrently
+from .columnar import convert_export
+from .tabulation import ResponseTable
+
+log = logging.getLogger(__name__)
+
+
+def convert_export_task(job):
+    '''
+        Converts a downloaded export into a ColumnarStore in a worker process.
+        job is (source, directory, data_layout_id); returns the directory.
+    '''
+    source, directory, data_layout_id = job
+    convert_export(source, directory, data_layout_id=data_layout_id)
+    return directory
+
+
+def response_counts_task(job):
+    '''
+        Tabulates a downloaded export in a worker process. job is (source,
+        payload) with a fetch_raw_results style payload; returns the counts.
+    '''
+    source, payload = job
+    return ResponseTable.from_export(source).response_counts(payload)
+
+
+class ProcessingPipeline(object):
+    '''
+        Runs CPU-heavy post-processing (decompressing, parsing, recoding,
+        tabulating) on a pool of worker processes while threads keep fetching,
+        so neither waits on the other and every core is used.
+
+        At most max_pending items are handed to the workers at once. Items
+        beyond that are not taken from the input, and fetches stall once the
+        fetch queue fills, so downloads never run far ahead of processing.
+
+        Processing functions must be defined at module level and take and
+        return picklable values; pass downloaded archives as file paths rather
+        than bytes.
+
+            with ProcessingPipeline() as pipeline:
+                results = pipeline.fetch_and_process(download_archive, convert_export_task, survey_ids, client=cmix)
+                for result in results:
+                    print(result.item, result.result, result.error)
+    '''
+    def __init__(self, max_workers=None, max_pending=None):
+        self.max_workers = max_workers or multiprocessing.cpu_count()
+        self.max_pending = max_pending or self.max_workers * 2
+        self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+    def _run(self, process, inputs):
+        # inputs yields (item, value, error); failed inputs pass straight through
+        inputs = iter(inputs)
+        pending = {}
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < self.max_pending:
+                try:
+                    item, value, error = next(inputs)
+                except StopIteration:
+                    exhausted = True
+                    break
+                if error is not None:
+                    yield BulkResult(item, None, error)
+                    continue
+                pending[self._executor.submit(process, value)] = item
+            if not pending:
+                return
+            done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+            for future in done:
+                item = pending.pop(future)
+                error = future.exception()
+                if error is not None:
+                    log.debug('Processing {} failed: {}'.format(item, error))
+                    yield BulkResult(item, None, error)
+                else:
+                    yield BulkResult(item, future.result(), None)
+
+    def map(self, process, items):
+        '''
+            Yields a BulkResult of process(item) for every item as it completes.
+        '''
+        return self._run(process, ((item, item, None) for item in items))
+
+    def fetch_and_process(self, fetch, process, items, client=None, max_fetchers=None, priority=None):
+        '''
+            Calls fetch(item) on threads (see map_concurrently) and
+            process(fetched) in the worker processes, yielding a BulkResult per
+            item with the processed result, or the error from whichever step
+            failed.
+        '''
+        fetched = map_concurrently(fetch, items, client=client, max_workers=max_fetchers, priority=priority)
+        return self._run(process, fetched)
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import logging
+import threading
+
+from .api import CmixAPI
+from .buffering import MemoryBudget
+from .limits import clock, CompositeLimiter, PriorityScheduler, RateLimiter
+from .transport import http2_session, shared_session
+
+log = logging.getLogger(__name__)
+
+
+class CmixClientPool(object):
+    '''
+        Hands out authenticated CmixAPI clients keyed by credentials. Every
+        client shares one HTTP session and the pool's global concurrency and
+        rate limits (and adaptive_limiter, e.g. an AdaptiveConcurrencyLimiter),
+        on top of its own per-tenant limits. Global and per-tenant slots are
+        both scheduled by priority class with priority_weights. With http2 the
+        shared session multiplexes requests over HTTP/2 connections. Large
+        bodies are spilled to disk past spill_threshold bytes or once the
+        clients together hold max_buffered_bytes of response bodies in memory.
+        Clients that have not been used for idle_seconds are dropped and
+        re-authenticated when next requested; a client counts as used while
+        any of its requests are in flight.
+    '''
+    def __init__(
+            self, test=False, timeout=None, max_connections=10, max_concurrency=None, rate_limit=None,
+            tenant_max_concurrency=None, tenant_rate_limit=None, idle_seconds=900, session=None, adaptive_limiter=None,
+            priority_weights=None, http2=False, spill_threshold=None, max_buffered_bytes=None
+    ):
+        self.test = test
+        self.timeout = timeout
+        self.tenant_max_concurrency = tenant_max_concurrency
+        self.tenant_rate_limit = tenant_rate_limit
+        self.idle_seconds = idle_seconds
+        self.priority_weights = priority_weights
+        self.spill_threshold = spill_threshold
+        self.memory_budget = MemoryBudget(max_buffered_bytes) if max_buffered_bytes is not None else None
+        if session is None:
+            session = http2_session(max_connections) if http2 else shared_session(max_connections)
+        self.session = session
+        self.global_limiters = []
+        rate_limiter = RateLimiter(rate_limit) if rate_limit is not None else None
+        if max_concurrency is not None:
+            # global slots and rate tokens are handed out by priority class
+            self.global_limiters.append(PriorityScheduler(max_concurrency, priority_weights, rate_limiter=rate_limiter))
+        elif rate_limiter is not None:
+            self.global_limiters.append(rate_limiter)
+        if adaptive_limiter is not None:
+            self.global_limiters.append(adaptive_limiter)
+        self._tenants = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tenants)
+
+    def _limiter(self):
+        limiters = []
+        rate_limiter = RateLimiter(self.tenant_rate_limit) if self.tenant_rate_limit is not None else None
+        if self.tenant_max_concurrency is not None:
+            # a tenant's interactive calls must not queue behind its own batch jobs either
+            limiters.append(PriorityScheduler(self.tenant_max_concurrency, self.priority_weights, rate_limiter=rate_limiter))
+        elif rate_limiter is not None:
+            limiters.append(rate_limiter)
+        # tenant limits come first so a throttled tenant never holds global slots while it waits
+        limiters.extend(self.global_limiters)
+        return CompositeLimiter(limiters) if limiters else None
+
+    def get_client(self, username, password, client_id, client_secret):
+        key = (username, password, client_id, client_secret)
+        self.evict_idle()
+        with self._lock:
+            tenant = self._tenants.get(key)
+            if tenant is None:
+                client = CmixAPI(
+                    username=username,
+                    password=password,
+                    client_id=client_id,
+                    client_secret=client_secret,
+                    test=self.test,
+                    timeout=self.timeout,
+                    session=self.session,
+                    limiter=self._limiter(),
+                    spill_threshold=self.spill_threshold,
+                    memory_budget=self.memory_budget
+                )
+                tenant = self._tenants[key] = {'client': client, 'authenticated': threading.Lock()}
+            tenant['last_used'] = clock()
+        with tenant['authenticated']:
+            if tenant['client']._authentication_headers is None:
+                log.debug('Authenticating pooled CMIX client for {}'.format(username))
+                tenant['client'].authenticate()
+        return tenant['client']
+
+    def _idle(self, tenant, cutoff):
+        client = tenant['client']
+        if client.requests_in_flight:
+            # a client in the middle of a request (or waiting for a slot) is never dropped
+            return False
+        return max(tenant['last_used'], client.last_used or tenant['last_used']) < cutoff
+
+    def evict_idle(self):
+        cutoff = clock() - self.idle_seconds
+        with self._lock:
+            for key in [key for key, tenant in self._tenants.items() if self._idle(tenant, cutoff)]:
+                del self._tenants[key]
+
+    def close(self):
+        with self._lock:
+            self._tenants.clear()
+        self.session.close()
@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import base64
+import gzip
+import io
+import json
+import threading
+import time
+import requests
+
+from collections import defaultdict, deque
+
+from .error import CmixError
+from .limits import clock
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+REDACTED = 'REDACTED'
+REDACTED_HEADERS = ('authorization', 'cookie', 'set-cookie')
+REDACTED_FIELDS = ('username', 'password', 'client_id', 'client_secret', 'access_token', 'refresh_token')
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return gzip.open(path, mode)
+    return io.open(path, mode)
+
+
+def _redact(value):
+    if isinstance(value, dict):
+        return dict((key, REDACTED if key in REDACTED_FIELDS else _redact(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return [_redact(item) for item in value]
+    return value
+
+
+def _redact_headers(headers):
+    return dict(
+        (key, REDACTED if key.lower() in REDACTED_HEADERS else value) for key, value in (headers or {}).items()
+    )
+
+
+def _request_size(json_body, data):
+    # the body as requests encodes it
+    if json_body is not None:
+        return len(json.dumps(json_body).encode('utf-8'))
+    if isinstance(data, dict):
+        data = urlencode(data)
+    if data is None:
+        return 0
+    return len(data if isinstance(data, bytes) else data.encode('utf-8'))
+
+
+def _encode_body(content):
+    if b'_token' in content:
+        # the auth endpoint hands back tokens in the body
+        try:
+            content = json.dumps(_redact(json.loads(content.decode('utf-8')))).encode('utf-8')
+        except ValueError:
+            pass
+    try:
+        return content.decode('utf-8'), 'utf-8'
+    except UnicodeDecodeError:
+        return base64.b64encode(content).decode('ascii'), 'base64'
+
+
+class RecordingSession(object):
+    '''
+        Wraps a session (by default the requests module) and appends every
+        request/response pair it makes to path as a JSON line, gzipped when the
+        path ends in .gz. Credentials and cookies in headers and bodies are
+        redacted so captures can be shared; timing and the request and response
+        sizes are kept for ReplaySession.
+
+            cmix = CmixAPI(..., session=RecordingSession('nightly.jsonl.gz'))
+    '''
+    def __init__(self, path, session=None):
+        self.path = path
+        self.session = session if session is not None else requests
+        self._started = clock()
+        self._lock = threading.Lock()
+        self._file = _open(path, 'wb')
+
+    def request(self, method, url, **kwargs):
+        started = clock()
+        response = self.session.request(method, url, **kwargs)
+        elapsed = clock() - started
+        body, encoding = _encode_body(response.content)
+        entry = {
+            'method': method.lower(),
+            'url': url,
+            'offset': started - self._started,
+            'elapsed': elapsed,
+            'request': {
+                'headers': _redact_headers(kwargs.get('headers')),
+                'json': _redact(kwargs.get('json')),
+                'data': _redact(kwargs.get('data')),
+                'bytes': _request_size(kwargs.get('json'), kwargs.get('data')),
+            },
+            'status': response.status_code,
+            'headers': _redact_headers(response.headers),
+            'body': body,
+            'encoding': encoding,
+            'bytes': len(response.content),
+        }
+        line = (json.dumps(entry) + '\n').encode('utf-8')
+        with self._lock:
+            self._file.write(line)
+        return response
+
+    def get(self, url, **kwargs):
+        return self.request('get', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('post', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('patch', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('delete', url, **kwargs)
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class ReplayResponse(object):
+    def __init__(self, entry):
+        self.url = entry['url']
+        self.status_code = entry['status']
+        self.headers = entry.get('headers', {})
+        if entry.get('encoding') == 'base64':
+            self.content = base64.b64decode(entry['body'])
+        else:
+            self.content = entry['body'].encode('utf-8')
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', 'replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+    def iter_content(self, chunk_size=1):
+        for offset in range(0, len(self.content), chunk_size):
+            yield self.content[offset:offset + chunk_size]
+
+    def close(self):
+        pass
+
+
+class ReplaySession(object):
+    '''
+        Serves the responses captured by RecordingSession without any network
+        access. Each method and URL replays its recorded responses in order,
+        repeating the last one once they run out. Responses are delayed by their
+        recorded latency times latency_scale (0 replays as fast as possible).
+
+            cmix = CmixAPI(..., session=ReplaySession('nightly.jsonl.gz', latency_scale=0.5))
+    '''
+    def __init__(self, path, latency_scale=1.0):
+        self.path = path
+        self.latency_scale = latency_scale
+        self._entries = defaultdict(deque)
+        self._lock = threading.Lock()
+        with _open(path, 'rb') as fh:
+            for line in fh:
+                entry = json.loads(line.decode('utf-8'))
+                self._entries[(entry['method'], entry['url'])].append(entry)
+
+    def _next_entry(self, method, url):
+        with self._lock:
+            entries = self._entries.get((method.lower(), url))
+            if not entries:
+                raise CmixError('No recorded response for {} {} in {}.'.format(method.upper(), url, self.path))
+            return entries.popleft() if len(entries) > 1 else entries[0]
+
+    def request(self, method, url, **kwargs):
+        entry = self._next_entry(method, url)
+        if self.latency_scale:
+            time.sleep(entry['elapsed'] * self.latency_scale)
+        return ReplayResponse(entry)
+
+    def get(self, url, **kwargs):
+        return self.request('get', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('post', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('patch', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('delete', url, **kwargs)
+
+    def close(self):
+        pass
@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import io
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from .buffering import ResponseBody
+from .error import CmixError
+
+log = logging.getLogger(__name__)
+
+KIND_XML = 'xml'
+KIND_DEFINITION = 'definition'
+
+# fields of the surveys/{id} response that change along with the survey's documents
+VALIDATOR_FIELDS = ('status', 'version', 'lastModified', 'lastModifiedDate', 'modifiedDate', 'updatedAt')
+
+# surveys/{id} may only carry the status, which doesn't change while a survey is edited
+DEFAULT_MAX_AGE = 3600
+
+_replace = getattr(os, 'replace', os.rename)
+
+
+def _makedirs(directory):
+    if not os.path.isdir(directory):
+        try:
+            os.makedirs(directory)
+        except OSError:
+            if not os.path.isdir(directory):
+                raise
+
+
+class DocumentStore(object):
+    '''
+        A content-addressed store of survey XML and definitions on local or
+        shared disk. Documents are saved once per distinct content under
+        objects/<sha1>, and surveys/<survey ID>.<kind>.json points each survey
+        at its latest document along with a validator: the status and
+        modification fields of the cheap surveys/{id} call when the document
+        was fetched. Documents are only downloaded again once the validator
+        changes or max_age seconds have passed.
+
+        Every file is written under a temporary name and renamed into place, so
+        any number of readers and writers, in any number of processes, can
+        share the directory.
+
+            store = DocumentStore('/shared/cmix-documents', cmix, max_age=86400)
+            xml = store.get_survey_xml(survey_id)
+
+        When the surveys/{id} response has no modification field, the
+        validator is just the status, and edits that keep the status (say, to
+        a survey in DESIGN) are only picked up once max_age has passed. Only
+        pass max_age=None when validator_fields name a field that changes with
+        every edit.
+    '''
+    def __init__(self, directory, client=None, max_age=DEFAULT_MAX_AGE, validator_fields=VALIDATOR_FIELDS):
+        self.directory = directory
+        self.client = client
+        self.max_age = max_age
+        self.validator_fields = validator_fields
+        self.objects_directory = os.path.join(directory, 'objects')
+        self.surveys_directory = os.path.join(directory, 'surveys')
+        _makedirs(self.objects_directory)
+        _makedirs(self.surveys_directory)
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_directory, digest[:2], digest)
+
+    def _entry_path(self, survey_id, kind):
+        return os.path.join(self.surveys_directory, '{}.{}.json'.format(survey_id, kind))
+
+    def _write_atomically(self, path, source):
+        directory = os.path.dirname(path)
+        _makedirs(directory)
+        handle, temporary = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with io.open(handle, 'wb') as fh:
+                shutil.copyfileobj(source, fh)
+            _replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    def put(self, survey_id, kind, source, validator=None):
+        '''
+            Stores a document, given as bytes or a binary file object with a
+            digest attribute (such as a ResponseBody), as the survey's latest
+            document of kind and returns its digest.
+        '''
+        if isinstance(source, bytes):
+            body = ResponseBody()
+            body.write(source)
+            body.seek(0)
+            source = body
+        digest = source.digest
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            # keep prune from deleting it before the entry below points at it
+            os.utime(path, None)
+        else:
+            self._write_atomically(path, source)
+        entry = {'digest': digest, 'validator': validator, 'stored_at': time.time()}
+        self._write_atomically(self._entry_path(survey_id, kind), io.BytesIO(json.dumps(entry).encode('utf-8')))
+        return digest
+
+    def entry(self, survey_id, kind):
+        '''
+            The survey's index entry for kind, or None if nothing is stored.
+        '''
+        try:
+            with io.open(self._entry_path(survey_id, kind), 'rb') as fh:
+                return json.loads(fh.read().decode('utf-8'))
+        except IOError:
+            return None
+
+    def open(self, survey_id, kind):
+        '''
+            Opens the latest stored document of kind for reading, or returns
+            None if there isn't one.
+        '''
+        entry = self.entry(survey_id, kind)
+        if entry is None:
+            return None
+        try:
+            return io.open(self._object_path(entry['digest']), 'rb')
+        except IOError:
+            return None
+
+    def get(self, survey_id, kind):
+        fh = self.open(survey_id, kind)
+        if fh is None:
+            return None
+        with fh:
+            return fh.read()
+
+    def validator(self, survey_id):
+        survey = self.client.api_get('surveys/{}'.format(survey_id))
+        return json.dumps(dict(
+            (field, survey[field]) for field in self.validator_fields if field in survey
+        ), sort_keys=True)
+
+    def is_fresh(self, entry, validator):
+        if entry is None or entry.get('validator') != validator:
+            return False
+        if self.max_age is not None and time.time() - entry['stored_at'] > self.max_age:
+            return False
+        return os.path.exists(self._object_path(entry['digest']))
+
+    def refresh(self, survey_id, kind, fetch):
+        '''
+            Downloads the document with fetch(survey_id) unless the stored one
+            is still fresh, and returns the digest of the current document.
+        '''
+        if self.client is None:
+            raise CmixError('A DocumentStore needs a client to fetch documents.')
+        # the validator is read before the document, so a change in between is
+        # picked up by the next refresh rather than missed
+        validator = self.validator(survey_id)
+        entry = self.entry(survey_id, kind)
+        if self.is_fresh(entry, validator):
+            return entry['digest']
+        log.debug('Fetching {} for CMIX survey {} into the document store'.format(kind, survey_id))
+        with fetch(survey_id) as body:
+            return self.put(survey_id, kind, body, validator)
+
+    def get_survey_xml(self, survey_id):
+        self.refresh(survey_id, KIND_XML, lambda survey_id: self.client.get_survey_xml(survey_id, as_file=True))
+        return self.get(survey_id, KIND_XML)
+
+    def get_survey_definition(self, survey_id):
+        self.refresh(
+            survey_id,
+            KIND_DEFINITION,
+            lambda survey_id: self.client.get_survey_definition(survey_id, as_file=True)
+        )
+        return json.loads(self.get(survey_id, KIND_DEFINITION).decode('utf-8'))
+
+    def prune(self, grace_seconds=3600):
+        '''
+            Deletes documents no survey points to any more. Documents younger
+            than grace_seconds are kept, since a writer may be about to point a
+            survey at them. Returns the number deleted.
+        '''
+        referenced = set()
+        for name in os.listdir(self.surveys_directory):
+            if name.endswith('.json'):
+                entry = self.entry(*name[:-len('.json')].rsplit('.', 1))
+                if entry is not None:
+                    referenced.add(entry['digest'])
+        cutoff = time.time() - grace_seconds
+        deleted = 0
+        for prefix in os.listdir(self.objects_directory):
+            directory = os.path.join(self.objects_directory, prefix)
+            for digest in os.listdir(directory):
+                path = os.path.join(directory, digest)
+                if digest not in referenced and os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    deleted += 1
+        return deleted
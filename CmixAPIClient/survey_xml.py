@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import hashlib
+import io
+import threading
+import xml.etree.ElementTree as ElementTree
+
+from collections import namedtuple, OrderedDict
+
+from .error import CmixError
+
+QUESTION_TAGS = ('question', )
+RESPONSE_TAGS = ('response', 'option', 'answer')
+
+Question = namedtuple('Question', ['id', 'name', 'type', 'responses'])
+Response = namedtuple('Response', ['id', 'name'])
+
+
+def _local_name(tag):
+    # strip any '{namespace}' prefix so the index works on namespaced XML too
+    if '}' in tag:
+        return tag.rsplit('}', 1)[1].lower()
+    return tag.lower()
+
+
+def _coerce_id(value):
+    if value is not None and value.isdigit():
+        return int(value)
+    return value
+
+
+def _element_name(elem):
+    name = elem.get('name') or elem.get('label')
+    if name is None and elem.text is not None:
+        name = elem.text.strip() or None
+    return name
+
+
+class SurveyIndex(object):
+    '''
+        A compact index of the questions and response options of a survey,
+        built without keeping the XML tree in memory.
+    '''
+    def __init__(self, survey_id, digest, questions):
+        self.survey_id = survey_id
+        self.digest = digest
+        self.questions = OrderedDict((question.id, question) for question in questions)
+        self._by_name = dict((question.name, question) for question in questions if question.name is not None)
+
+    def __len__(self):
+        return len(self.questions)
+
+    def __contains__(self, question_id):
+        return question_id in self.questions
+
+    def get_question(self, question_id):
+        question = self.questions.get(question_id)
+        if question is None:
+            question = self._by_name.get(question_id)
+        if question is None:
+            raise CmixError('Question {} is not in the index for CMIX survey {}.'.format(question_id, self.survey_id))
+        return question
+
+    def response_ids(self, question_id):
+        return [response.id for response in self.get_question(question_id).responses]
+
+    def raw_results_payload(self, question_ids=None):
+        '''
+            Builds the payload expected by CmixAPI.fetch_raw_results, covering
+            every indexed question unless question_ids is given.
+        '''
+        if question_ids is None:
+            question_ids = self.questions.keys()
+        return [{'questionId': self.get_question(question_id).id} for question_id in question_ids]
+
+    def crosstab_payloads(self, question_a, question_b, test_yn='LIVE', status='COMPLETE'):
+        '''
+            Builds one 'response-counts' payload per response of question_b,
+            counting question_a filtered on that response - the same payloads
+            CmixAPI.fetch_banner_filter sends, without a round trip per cut.
+        '''
+        counted = self.get_question(question_a)
+        filtered = self.get_question(question_b)
+        payloads = []
+        for response in filtered.responses:
+            payloads.append({
+                'testYN': test_yn,
+                'status': status,
+                'counts': [{
+                    'questionId': counted.id,
+                    'resolution': 1
+                }],
+                'filters': [{
+                    'questionId': filtered.id,
+                    'responseId': response.id
+                }]
+            })
+        return payloads
+
+
+def _discard(elem, parent):
+    elem.clear()
+    if parent is not None:
+        parent.remove(elem)
+
+
+def parse_survey_xml(source, survey_id=None, digest=None,
+                     question_tags=QUESTION_TAGS, response_tags=RESPONSE_TAGS):
+    '''
+        Incrementally parses survey XML into a SurveyIndex.
+
+        source can be the bytes returned by CmixAPI.get_survey_xml or any
+        readable binary file object. Elements are cleared and detached from
+        their parent as soon as they have been indexed, so memory doesn't grow
+        with the number of questions.
+    '''
+    if isinstance(source, bytes):
+        source = io.BytesIO(source)
+    questions = []
+    current = None
+    # the open elements, so finished ones can be detached from their parents
+    open_elements = []
+    try:
+        for event, elem in ElementTree.iterparse(source, events=('start', 'end')):
+            tag = _local_name(elem.tag)
+            if event == 'start':
+                open_elements.append(elem)
+                if tag in question_tags and current is None:
+                    name = elem.get('name') or elem.get('label')
+                    current = Question(_coerce_id(elem.get('id')), name, elem.get('type'), [])
+                continue
+            open_elements.pop()
+            if tag in response_tags and current is not None:
+                current.responses.append(Response(_coerce_id(elem.get('id')), _element_name(elem)))
+            elif tag in question_tags and current is not None:
+                questions.append(current)
+                current = None
+            if current is None:
+                _discard(elem, open_elements[-1] if open_elements else None)
+    except ElementTree.ParseError as e:
+        raise CmixError('Could not parse the XML for CMIX survey {}. Error: {}'.format(survey_id, e))
+    return SurveyIndex(survey_id, digest, questions)
+
+
+class SurveyIndexCache(object):
+    '''
+        A small thread-safe LRU cache of SurveyIndex objects keyed by survey ID
+        and the hash of the XML they were built from.
+    '''
+    def __init__(self, max_entries=32):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(content):
+        return hashlib.sha1(content).hexdigest()
+
+    def get(self, survey_id, digest):
+        with self._lock:
+            index = self._entries.pop((survey_id, digest), None)
+            if index is not None:
+                self._entries[(survey_id, digest)] = index
+            return index
+
+    def put(self, index):
+        with self._lock:
+            self._entries.pop((index.survey_id, index.digest), None)
+            self._entries[(index.survey_id, index.digest)] = index
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_parse(self, survey_id, content, digest=None):
+        '''
+            content is XML bytes, or a binary file object when its digest is
+            given.
+        '''
+        if digest is None:
+            digest = self.digest(content)
+        index = self.get(survey_id, digest)
+        if index is None:
+            index = parse_survey_xml(content, survey_id=survey_id, digest=digest)
+            self.put(index)
+        return index
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
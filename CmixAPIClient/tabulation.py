@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import array
+import operator
+
+from collections import Counter, OrderedDict
+from itertools import compress
+
+from .error import CmixError
+from .export import iter_export_rows
+
+
+def _coerce_response(value):
+    if value.isdigit():
+        return int(value)
+    return value
+
+
+class Column(object):
+    '''
+        A dictionary-encoded column: the distinct values seen in the column and
+        one integer code per row pointing into them.
+    '''
+    def __init__(self, name, values, codes):
+        self.name = name
+        self.values = values
+        self.codes = codes
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        values = self.values
+        for code in self.codes:
+            yield values[code]
+
+    def lookup(self, wanted):
+        '''
+            Returns a bytearray indexed by code that is 1 for the codes whose
+            value is one of the wanted response IDs.
+        '''
+        if not isinstance(wanted, (list, tuple, set)):
+            wanted = [wanted]
+        wanted = set('{}'.format(value) for value in wanted)
+        return bytearray(1 if value in wanted else 0 for value in self.values)
+
+    def mask(self, wanted):
+        return bytearray(map(self.lookup(wanted).__getitem__, self.codes))
+
+    def counts(self, mask=None):
+        codes = self.codes if mask is None else compress(self.codes, mask)
+        counted = Counter(codes)
+        result = OrderedDict()
+        for code, value in enumerate(self.values):
+            if value != '' and counted.get(code):
+                result[_coerce_response(value)] = counted[code]
+        return result
+
+
+class ColumnBuilder(object):
+    def __init__(self, name):
+        self.name = name
+        self.values = []
+        self.codes = array.array(str('i'))
+        self._index = {}
+
+    def append(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.values)
+            self.values.append(value)
+        self.codes.append(code)
+
+    def build(self):
+        return Column(self.name, self.values, self.codes)
+
+
+class ResponseTable(object):
+    '''
+        Answers 'response-counts' style queries locally from an export produced
+        by CmixAPI.create_export_archive, instead of one reporting API request
+        per cut.
+
+        Columns are dictionary encoded, so counts and filters run as C-level
+        passes over integer code arrays rather than per-row Python logic.
+    '''
+    def __init__(self, columns, index=None):
+        self.columns = OrderedDict((column.name, column) for column in columns)
+        self.index = index
+
+    @classmethod
+    def from_export(cls, source, delimiter=None, usecols=None, index=None, encoding='utf-8'):
+        '''
+            Builds a table from a downloaded export. usecols restricts the table
+            to the named columns; index is an optional SurveyIndex used to map
+            question IDs onto the export's question name columns.
+        '''
+        rows = iter_export_rows(source, delimiter=delimiter, encoding=encoding)
+        header = next(rows, None)
+        if header is None:
+            raise CmixError('Export {} is empty.'.format(source))
+        positions = [position for position, name in enumerate(header) if usecols is None or name in usecols]
+        builders = [ColumnBuilder(header[position]) for position in positions]
+        for row in rows:
+            for position, builder in zip(positions, builders):
+                builder.append(row[position] if position < len(row) else '')
+        return cls([builder.build() for builder in builders], index=index)
+
+    def __len__(self):
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def column(self, question_id):
+        name = '{}'.format(question_id)
+        if name not in self.columns and self.index is not None and question_id in self.index:
+            name = self.index.get_question(question_id).name
+        column = self.columns.get(name)
+        if column is None:
+            raise CmixError('Question {} has no column in this export.'.format(question_id))
+        return column
+
+    def select(self, filters):
+        '''
+            Returns a row mask for a list of {'questionId', 'responseId'}
+            filters, which are combined with AND. None selects every row.
+        '''
+        mask = None
+        for row_filter in filters or []:
+            column_mask = self.column(row_filter['questionId']).mask(row_filter['responseId'])
+            mask = column_mask if mask is None else bytearray(map(operator.and_, mask, column_mask))
+        return mask
+
+    def counts(self, question_id, filters=None):
+        counts = self.column(question_id).counts(self.select(filters))
+        return {
+            'questionId': question_id,
+            'total': sum(counts.values()),
+            'counts': [{'responseId': response_id, 'count': count} for response_id, count in counts.items()],
+        }
+
+    def response_counts(self, payload):
+        '''
+            Accepts either payload understood by the 'response-counts' endpoint:
+            the list of {'questionId'} objects sent by CmixAPI.fetch_raw_results,
+            or the {'counts', 'filters'} object sent by fetch_banner_filter.
+            'testYN' and 'status' are ignored as an export already holds a
+            single respondent type.
+        '''
+        if isinstance(payload, dict):
+            questions = payload.get('counts', [])
+            filters = payload.get('filters')
+        else:
+            questions = payload
+            filters = None
+        return [self.counts(question['questionId'], filters) for question in questions]
+
+    def crosstab(self, question_a, question_b, filters=None):
+        '''
+            Counts question_a for each response of question_b in a single pass,
+            the local equivalent of one fetch_banner_filter call per response.
+        '''
+        column_a = self.column(question_a)
+        column_b = self.column(question_b)
+        pairs = zip(column_b.codes, column_a.codes)
+        mask = self.select(filters)
+        counted = Counter(pairs if mask is None else compress(pairs, mask))
+        table = []
+        for code_b, value_b in enumerate(column_b.values):
+            if value_b == '':
+                continue
+            counts = [
+                {'responseId': _coerce_response(value_a), 'count': counted[(code_b, code_a)]}
+                for code_a, value_a in enumerate(column_a.values)
+                if value_a != '' and counted.get((code_b, code_a))
+            ]
+            table.append({
+                'filter': {'questionId': question_b, 'responseId': _coerce_response(value_b)},
+                'questionId': question_a,
+                'total': sum(count['count'] for count in counts),
+                'counts': counts,
+            })
+        return table
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import logging
+import requests
+
+from contextlib import contextmanager
+from requests.adapters import HTTPAdapter
+
+from .error import CmixConnectionError, CmixError, CmixTimeoutError
+
+try:
+    from http.cookiejar import DefaultCookiePolicy
+except ImportError:
+    from cookielib import DefaultCookiePolicy
+
+log = logging.getLogger(__name__)
+
+# one pool per CMIX service host
+POOL_HOSTS = 6
+
+
+def shared_session(max_connections=10):
+    '''
+        A requests.Session with one connection pool of up to max_connections
+        sockets per CMIX host. Cookies are refused so that tenants sharing the
+        session never see each other's state.
+    '''
+    session = requests.Session()
+    session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=max_connections)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class StreamedResponse(object):
+    '''
+        An httpx response opened with stream=True, with the iter_content and
+        content of a requests response. Errors reading the body are raised as
+        CmixErrors.
+    '''
+    def __init__(self, response, errors):
+        self._response = response
+        self._errors = errors
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def iter_content(self, chunk_size=1):
+        with self._errors():
+            for chunk in self._response.iter_bytes(chunk_size):
+                yield chunk
+
+    def _read(self):
+        with self._errors():
+            return self._response.read()
+
+    @property
+    def content(self):
+        return self._read()
+
+    @property
+    def text(self):
+        self._read()
+        return self._response.text
+
+    def json(self, **kwargs):
+        self._read()
+        return self._response.json(**kwargs)
+
+    def close(self):
+        self._response.close()
+
+
+class HTTP2Session(object):
+    '''
+        A requests-compatible session backed by an httpx client, which
+        multiplexes concurrent requests over a few HTTP/2 connections per host.
+        Hosts that don't negotiate HTTP/2 are spoken to over HTTP/1.1. httpx
+        timeouts are raised as CmixTimeoutError, network failures as
+        CmixConnectionError and its other transport errors as CmixError.
+
+        Requires the http2 extra: pip install python-cmixapi-client[http2]
+    '''
+    def __init__(self, max_connections=10):
+        import httpx
+        self._httpx = httpx
+        self._client = httpx.Client(
+            http2=True,
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+
+    def _timeout(self, timeout):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+            return self._httpx.Timeout(read, connect=connect)
+        return self._httpx.Timeout(timeout)
+
+    def _errors(self, method, url):
+        @contextmanager
+        def errors():
+            try:
+                yield
+            except self._httpx.TimeoutException as e:
+                raise CmixTimeoutError(
+                    'CMIX did not respond to {} {} in time: {}'.format(method.upper(), url, e), url=url, method=method
+                )
+            except self._httpx.NetworkError as e:
+                raise CmixConnectionError(
+                    'Could not connect to CMIX for {} {}: {}'.format(method.upper(), url, e), url=url, method=method
+                )
+            except self._httpx.HTTPError as e:
+                raise CmixError('{} {} to CMIX failed: {}'.format(method.upper(), url, e), url=url, method=method)
+        return errors
+
+    def request(self, method, url, headers=None, json=None, data=None, timeout=None, stream=False):
+        errors = self._errors(method, url)
+        options = dict(headers=headers, json=json, data=data, timeout=self._timeout(timeout))
+        with errors():
+            if not stream:
+                return self._client.request(method.upper(), url, **options)
+            # what client.stream() does, without tying the response to a with block
+            request = self._client.build_request(method.upper(), url, **options)
+            return StreamedResponse(self._client.send(request, stream=True), errors)
+
+    def get(self, url, **kwargs):
+        return self.request('get', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('post', url, **kwargs)
+
+    def patch(self, url, **kwargs):
+        return self.request('patch', url, **kwargs)
+
+    def delete(self, url, **kwargs):
+        return self.request('delete', url, **kwargs)
+
+    def close(self):
+        self._client.close()
+
+
+def http2_session(max_connections=10):
+    '''
+        Returns an HTTP2Session, or a pooled HTTP/1.1 requests session when
+        httpx and its HTTP/2 support are not installed.
+    '''
+    try:
+        return HTTP2Session(max_connections)
+    except ImportError as e:
+        log.warning('HTTP/2 transport unavailable, falling back to HTTP/1.1: {}'.format(e))
+        return shared_session(max_connections)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+import datetime
+import logging
+import threading
+
+from collections import namedtuple
+
+from .api import CmixAPI
+
+log = logging.getLogger(__name__)
+
+StatusChange = namedtuple('StatusChange', ['survey_id', 'old_status', 'new_status', 'survey'])
+
+
+class SurveyStatusWatcher(object):
+    '''
+        Tracks the status of every survey in the account from the get_surveys
+        listings, one request per status per poll, instead of calling
+        get_survey_status for each survey.
+
+        After the first full listing only surveys whose status changed since
+        the previous poll are requested, using the statusAfter url param. The
+        poll interval halves while changes keep arriving and backs off towards
+        max_interval while the account is quiet.
+    '''
+    STATUSES = (CmixAPI.SURVEY_STATUS_DESIGN, CmixAPI.SURVEY_STATUS_LIVE, CmixAPI.SURVEY_STATUS_CLOSED)
+    STATUS_AFTER_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+    def __init__(self, client, statuses=None, callback=None, min_interval=5, max_interval=300, overlap=60):
+        self.client = client
+        self.watched_statuses = statuses if statuses is not None else self.STATUSES
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        # how far back each incremental poll reaches, to cover clock skew
+        self.overlap = datetime.timedelta(seconds=overlap)
+        self.statuses = {}
+        self._callbacks = [callback] if callback is not None else []
+        self._last_poll = None
+        self._stopped = threading.Event()
+
+    def add_callback(self, callback):
+        self._callbacks.append(callback)
+
+    def _now(self):
+        return datetime.datetime.utcnow()
+
+    def _extra_params(self):
+        if self._last_poll is None:
+            return None
+        since = self._last_poll - self.overlap
+        return ['{}={}'.format(CmixAPI.SURVEY_PARAMS_STATUS_AFTER, since.strftime(self.STATUS_AFTER_FORMAT))]
+
+    def poll(self):
+        '''
+            Fetches the listings once and returns the list of StatusChange
+            events since the previous poll. The first poll only records the
+            current statuses.
+        '''
+        started = self._now()
+        extra_params = self._extra_params()
+        # nothing is recorded until every listing has arrived, so a failed poll
+        # leaves its changes to be seen by the next one
+        statuses = dict(self.statuses)
+        changes = []
+        for listed_status in self.watched_statuses:
+            for survey in self.client.get_surveys(listed_status, extra_params=extra_params):
+                change = self._record(statuses, survey, listed_status)
+                if change is not None and extra_params is not None:
+                    changes.append(change)
+        self.statuses = statuses
+        self._last_poll = started
+        self._adapt_interval(changes)
+        for change in changes:
+            for callback in self._callbacks:
+                callback(change)
+        return changes
+
+    def _record(self, statuses, survey, listed_status):
+        survey_id = survey.get('id')
+        new_status = (survey.get('status') or listed_status).lower()
+        old_status = statuses.get(survey_id)
+        statuses[survey_id] = new_status
+        if old_status == new_status:
+            return None
+        return StatusChange(survey_id, old_status, new_status, survey)
+
+    def _adapt_interval(self, changes):
+        if changes:
+            self.interval = max(self.min_interval, self.interval / 2.0)
+        else:
+            self.interval = min(self.max_interval, self.interval * 1.5)
+        log.debug('Survey status watcher saw {} changes, next poll in {}s'.format(len(changes), self.interval))
+
+    def watch(self, max_polls=None):
+        '''
+            Polls until stop() is called (or max_polls polls have run) and
+            yields each StatusChange as it is seen.
+        '''
+        polls = 0
+        while not self._stopped.is_set():
+            for change in self.poll():
+                yield change
+            polls += 1
+            if max_polls is not None and polls >= max_polls:
+                break
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
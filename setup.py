@@ -14,7 +14,13 @@ setuptools.setup(
     url="https://github.com/dynata/python-cmixapi-client",
     packages=setuptools.find_packages(exclude=('tests', )),
     platforms=['Any'],
-    install_requires=['requests'],
+    install_requires=['requests', 'futures; python_version < "3"'],
+    extras_require={
+        'http2': ['httpx[http2]'],
+    },
+    entry_points={
+        'console_scripts': ['cmix=CmixAPIClient.cli:main'],
+    },
     setup_requires=['pytest-runner'],
     tests_require=['pytest'],
     keywords='cmix api dynata popresearch',
@@ -144,6 +144,63 @@ class TestCmixAPI(TestCase):
                 with self.assertRaises(CmixError):
                     self.cmix_api.create_export_archive(self.survey_id, 'XLSX_READABLE')
 
+    def test_create_export_archive_reuses_recent_archive(self):
+        self.cmix_api.archive_reuse_seconds = 600
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_post_response = mock.Mock()
+            mock_post_response.status_code = 200
+            mock_post_response.json.return_value = {'id': 42}
+            mock_request.post.return_value = mock_post_response
+            mock_response = mock.Mock()
+            mock_response.status_code = 200
+            mock_response.json.return_value = [{'id': 1, 'name': 'Default'}]
+            mock_request.get.return_value = mock_response
+
+            first = self.cmix_api.create_export_archive(self.survey_id, 'CSV', in_process=True)
+            second = self.cmix_api.create_export_archive(self.survey_id, 'CSV', in_process=True)
+            self.assertEqual(first, second)
+            self.assertEqual(mock_request.post.call_count, 1)
+            self.assertTrue(mock_request.post.call_args[1]['json']['inProcess'])
+
+            # different filters, or reuse disabled for the call, build a new archive
+            self.cmix_api.create_export_archive(self.survey_id, 'CSV')
+            self.cmix_api.create_export_archive(self.survey_id, 'CSV', in_process=True, reuse_within=0)
+            self.assertEqual(mock_request.post.call_count, 3)
+
+            # archives older than the freshness window are not reused
+            with mock.patch('CmixAPIClient.api.time.time', return_value=10 ** 12):
+                self.cmix_api.create_export_archive(self.survey_id, 'CSV', in_process=True)
+            self.assertEqual(mock_request.post.call_count, 4)
+
+    def test_failed_archives_are_not_reused(self):
+        self.cmix_api.archive_reuse_seconds = 600
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.post.return_value = mock.Mock(status_code=200)
+            mock_request.post.return_value.json.return_value = {'id': 42}
+            layouts = mock.Mock(status_code=200)
+            layouts.json.return_value = [{'id': 1, 'name': 'Default'}]
+            failed = mock.Mock(status_code=200)
+            failed.json.return_value = {'status': 'FAILED'}
+            mock_request.get.side_effect = [layouts, failed, layouts]
+
+            archive = self.cmix_api.create_export_archive(self.survey_id, 'CSV')
+            self.cmix_api.get_archive_status(self.survey_id, archive['id'], archive['dataLayoutId'])
+            self.cmix_api.create_export_archive(self.survey_id, 'CSV')
+            self.assertEqual(mock_request.post.call_count, 2)
+
+    def test_expired_archives_are_pruned(self):
+        self.cmix_api.archive_reuse_seconds = 600
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.post.return_value = mock.Mock(status_code=200)
+            mock_request.post.return_value.json.return_value = {'id': 42}
+            mock_request.get.return_value = mock.Mock(status_code=200)
+            mock_request.get.return_value.json.return_value = [{'id': 1, 'name': 'Default'}]
+            for survey_id in range(5):
+                self.cmix_api.create_export_archive(survey_id, 'CSV')
+            with mock.patch('CmixAPIClient.api.time.time', return_value=10 ** 12):
+                self.cmix_api.create_export_archive(self.survey_id, 'CSV')
+            self.assertEqual(len(self.cmix_api._recent_archives), 1)
+
     def test_get_survey_data_layouts(self):
         self.cmix_api._authentication_headers = {'Authentication': 'Bearer test'}
 
@@ -297,6 +354,32 @@ class TestCmixAPI(TestCase):
             with self.assertRaises(CmixError):
                 self.cmix_api.get_survey_test_url(self.survey_id)
 
+    def test_get_survey_test_urls(self):
+        test_base_url = CMIX_SERVICES['test']['BASE_URL']
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_listing = mock.Mock(status_code=200)
+            mock_listing.json.return_value = [{'id': 1, 'testToken': 'listed'}, {'id': 2}]
+            mock_request.get.return_value = mock_listing
+            self.cmix_api.get_surveys('LIVE')
+
+            def get_survey(url, **kwargs):
+                survey_id = int(url.rsplit('/', 1)[1])
+                response = mock.Mock(status_code=200)
+                response.json.return_value = {'testToken': 'fetched'} if survey_id != 3 else {}
+                return response
+            mock_request.get.side_effect = get_survey
+
+            test_urls = self.cmix_api.get_survey_test_urls([1, 2, 3])
+            self.assertEqual(test_urls, {
+                1: '{}/#/?cmixSvy=1&cmixTest=listed'.format(test_base_url),
+                2: '{}/#/?cmixSvy=2&cmixTest=fetched'.format(test_base_url),
+            })
+            self.assertEqual(mock_request.get.call_count, 3)
+
+            # tokens looked up once are reused
+            self.cmix_api.get_survey_test_urls([1, 2])
+            self.assertEqual(mock_request.get.call_count, 3)
+
     def test_get_survey_completes(self):
         with mock.patch('CmixAPIClient.api.requests') as mock_request:
             mock_post = mock.Mock()
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import hashlib
+import json
+import mock
+
+from unittest import TestCase
+from CmixAPIClient.api import CmixAPI, CMIX_SERVICES
+from CmixAPIClient.buffering import MemoryBudget, read_body, ResponseBody
+from CmixAPIClient.error import CmixNotFoundError
+from CmixAPIClient.pool import CmixClientPool
+from .test_survey_xml import SURVEY_XML
+
+
+def streamed_response(body):
+    response = mock.Mock(status_code=200)
+    response.iter_content.side_effect = lambda chunk_size: (
+        body[offset:offset + chunk_size] for offset in range(0, len(body), chunk_size)
+    )
+    return response
+
+
+def buffered_cmix_api(**kwargs):
+    cmix_api = CmixAPI(
+        username="test_username",
+        password="test_password",
+        client_id="test_client_id",
+        client_secret="test_client_secret",
+        timeout=5,
+        **kwargs
+    )
+    cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+    return cmix_api
+
+
+class TestBuffering(TestCase):
+    def test_small_bodies_stay_in_memory(self):
+        response = streamed_response(b'{"id": 1}')
+        with read_body(response, spill_threshold=100, chunk_size=4) as body:
+            self.assertFalse(body.spilled)
+            self.assertEqual(body.json(), {'id': 1})
+            self.assertEqual(body.digest, hashlib.sha1(b'{"id": 1}').hexdigest())
+        response.close.assert_called_once_with()
+
+    def test_large_bodies_spill(self):
+        content = b'x' * 1000
+        with read_body(streamed_response(content), spill_threshold=100, chunk_size=64) as body:
+            self.assertTrue(body.spilled)
+            self.assertEqual(body.size, 1000)
+            self.assertEqual(body.read(), content)
+
+    def test_memory_budget(self):
+        budget = MemoryBudget(100)
+        first = read_body(streamed_response(b'a' * 80), budget=budget)
+        self.assertFalse(first.spilled)
+        self.assertEqual(budget.used, 80)
+        second = read_body(streamed_response(b'b' * 80), budget=budget)
+        self.assertTrue(second.spilled)
+        self.assertEqual(budget.used, 80)
+        first.close()
+        second.close()
+        self.assertEqual(budget.used, 0)
+
+    def test_failed_read_releases_budget(self):
+        budget = MemoryBudget(100)
+
+        def reset(chunk_size):
+            yield b'a' * 10
+            raise IOError('connection reset')
+
+        response = mock.Mock()
+        response.iter_content.side_effect = reset
+        with self.assertRaises(IOError):
+            read_body(response, budget=budget)
+        self.assertEqual(budget.used, 0)
+        response.close.assert_called_once_with()
+
+    def test_client_streams_when_configured(self):
+        cmix_api = buffered_cmix_api(spill_threshold=10)
+        definition = {'questions': list(range(100))}
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.return_value = streamed_response(json.dumps(definition).encode('utf-8'))
+            self.assertEqual(cmix_api.get_survey_definition(1337), definition)
+            url = '{}/surveys/1337/definition'.format(CMIX_SERVICES['survey']['BASE_URL'])
+            mock_request.get.assert_called_once_with(
+                url, headers=cmix_api._authentication_headers, timeout=5, stream=True
+            )
+
+            mock_request.post.return_value = streamed_response(b'[{"questionId": 1}]')
+            with cmix_api.fetch_raw_results(1337, [{'questionId': 1}], as_file=True) as body:
+                self.assertIsInstance(body, ResponseBody)
+                self.assertEqual(body.json(), [{'questionId': 1}])
+
+    def test_error_responses_match_the_plain_path(self):
+        not_found = b'{"message": "not found"}'
+        plain = buffered_cmix_api()
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.return_value = mock.Mock(status_code=404, content=not_found)
+            mock_request.get.return_value.json.return_value = json.loads(not_found.decode('utf-8'))
+            expected = plain.get_survey_definition(1337)
+        cmix_api = buffered_cmix_api(spill_threshold=10, memory_budget=MemoryBudget(1024))
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            response = streamed_response(not_found)
+            response.status_code, response.content = 404, not_found
+            mock_request.get.return_value = response
+            self.assertEqual(cmix_api.get_survey_definition(1337), expected)
+            with self.assertRaises(CmixNotFoundError):
+                cmix_api.get_survey_definition(1337, as_file=True)
+        self.assertEqual(cmix_api.memory_budget.used, 0)
+
+    def test_survey_index_parses_from_spilled_body(self):
+        cmix_api = buffered_cmix_api(spill_threshold=10)
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.side_effect = lambda *args, **kwargs: streamed_response(SURVEY_XML)
+            index = cmix_api.get_survey_index(1337)
+            self.assertEqual(index.digest, hashlib.sha1(SURVEY_XML).hexdigest())
+            self.assertIs(cmix_api.get_survey_index(1337), index)
+            self.assertEqual(cmix_api.get_survey_xml(1337), SURVEY_XML)
+
+    def test_pool_shares_budget(self):
+        pool = CmixClientPool(session=mock.Mock(), spill_threshold=1024, max_buffered_bytes=4096)
+        with mock.patch.object(CmixAPI, 'authenticate'):
+            first = pool.get_client('a', 'p', 'id', 'secret')
+            second = pool.get_client('b', 'p', 'id', 'secret')
+        self.assertIs(first.memory_budget, second.memory_budget)
+        self.assertEqual(first.spill_threshold, 1024)
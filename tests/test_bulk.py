@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import mock
+
+from unittest import TestCase
+from CmixAPIClient.bulk import DEFAULT_WORKERS, map_concurrently, worker_count
+from CmixAPIClient.limits import AdaptiveConcurrencyLimiter, CompositeLimiter, ConcurrencyLimiter
+
+
+def square(item):
+    if item == 3:
+        raise ValueError('three')
+    return item * item
+
+
+class TestBulk(TestCase):
+    def test_worker_count(self):
+        self.assertEqual(worker_count(), DEFAULT_WORKERS)
+        self.assertEqual(worker_count(max_workers=3), 3)
+        client = mock.Mock(limiter=AdaptiveConcurrencyLimiter(maximum=32))
+        self.assertEqual(worker_count(client), 32)
+        client.limiter = CompositeLimiter([ConcurrencyLimiter(5), client.limiter])
+        self.assertEqual(worker_count(client), 5)
+
+    def test_map_concurrently(self):
+        results = sorted(map_concurrently(square, iter(range(10)), max_workers=2))
+        self.assertEqual(len(results), 10)
+        self.assertEqual(results[2].result, 4)
+        self.assertIsInstance(results[3].error, ValueError)
+        self.assertIsNone(results[3].result)
+
+    def test_map_concurrently_empty(self):
+        self.assertEqual(list(map_concurrently(square, [])), [])
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import json
+import mock
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+from CmixAPIClient import cli
+from CmixAPIClient.error import CmixError
+
+
+class TestCli(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.client = mock.MagicMock()
+        self.client.SURVEY_STATUS_LIVE = 'LIVE'
+        self.client.SURVEY_PARAMS_STATUS_AFTER = 'statusAfter'
+        self.client.limiter = None
+        self.client.active_deadlines.return_value = []
+        self.client.get_surveys.side_effect = lambda status, extra_params=None: [
+            {'id': 1, 'status': status}, {'id': 2, 'status': status}
+        ]
+        self.client.get_survey_definition.side_effect = lambda survey_id: {'survey': survey_id}
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_cli(self, argv, resume_path=None):
+        args = cli.parse_args(argv)
+        stream = io.StringIO()
+        failures = cli.run(args, self.client, cli.NDJSONWriter(stream), cli.ResumeLog(resume_path))
+        return failures, [json.loads(line) for line in stream.getvalue().splitlines()]
+
+    def test_surveys(self):
+        failures, lines = self.run_cli(['surveys', '--status', 'LIVE', '--status', 'CLOSED', '--status-after', '2020-01-01'])
+        self.assertEqual(failures, 0)
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[3], {'command': 'surveys', 'id': 2, 'data': {'id': 2, 'status': 'CLOSED'}})
+        self.client.get_surveys.assert_any_call('CLOSED', extra_params=['statusAfter=2020-01-01'])
+
+    def test_surveys_by_id_are_fetched(self):
+        self.client.api_get.side_effect = lambda endpoint, error='': {'id': 5, 'endpoint': endpoint}
+        failures, lines = self.run_cli(['surveys', '--id', '5'])
+        self.assertEqual(lines, [{'command': 'surveys', 'id': '5', 'data': {'id': 5, 'endpoint': 'surveys/5'}}])
+        self.client.get_surveys.assert_not_called()
+
+    def test_definitions_concurrently(self):
+        failures, lines = self.run_cli(['definitions', '--workers', '2'])
+        self.assertEqual(sorted(line['data']['survey'] for line in lines), [1, 2])
+
+    def test_failures_are_counted(self):
+        self.client.get_survey_definition.side_effect = CmixError('not found')
+        failures, lines = self.run_cli(['definitions', '--id', '7'])
+        self.assertEqual((failures, lines), (1, []))
+
+    def test_resume_skips_finished_items(self):
+        resume_path = os.path.join(self.directory, 'resume.log')
+        self.run_cli(['definitions', '--id', '1'], resume_path)
+        failures, lines = self.run_cli(['definitions', '--id', '1', '--id', '2'], resume_path)
+        self.assertEqual([line['id'] for line in lines], ['2'])
+        self.assertEqual(self.client.get_survey_definition.call_count, 2)
+
+    def test_directory_writer(self):
+        writer = cli.DirectoryWriter(self.directory)
+        writer.write('definitions', 7, {'survey': 7})
+        with io.open(os.path.join(self.directory, 'definitions', '7.json'), 'rb') as fh:
+            self.assertEqual(json.loads(fh.read().decode('utf-8')), {'survey': 7})
+
+    def test_project_snapshot(self):
+        self.client.api_get.return_value = {'id': 3}
+        failures, lines = self.run_cli(['projects', '--id', '3'])
+        self.assertEqual(sorted(lines[0]['data'].keys()), ['project', 'sources', 'surveys'])
+
+    def test_main_requires_credentials(self):
+        with mock.patch.dict('os.environ', {}, clear=True):
+            self.assertEqual(cli.main(['surveys']), 2)
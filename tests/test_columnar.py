@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+from CmixAPIClient import columnar
+from CmixAPIClient.columnar import ColumnarStore, convert_export
+from CmixAPIClient.error import CmixError
+from CmixAPIClient.tabulation import ResponseTable
+from .test_tabulation import EXPORT_CSV
+
+
+class TestColumnarStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store_directory = os.path.join(self.directory, 'store')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_convert_export(self):
+        store = convert_export(io.BytesIO(EXPORT_CSV), self.store_directory, data_layout_id=7)
+        self.assertEqual(len(store), 5)
+        self.assertEqual(store.data_layout_id, 7)
+        self.assertEqual(store.columns, ['respondentId', 'Q1', 'Q2'])
+        reopened = ColumnarStore(self.store_directory)
+        self.assertEqual(list(reopened.column('Q2')), ['10', '11', '10', '', '10'])
+
+    def test_convert_export_flushes_in_chunks(self):
+        original = columnar.CHUNK_ROWS
+        columnar.CHUNK_ROWS = 2
+        try:
+            store = convert_export(io.BytesIO(EXPORT_CSV), self.store_directory)
+            codes = store.column('Q1').codes
+            self.assertEqual(list(codes), [0, 0, 1, 1, 0])
+            self.assertEqual(codes[-1], 0)
+            with self.assertRaises(IndexError):
+                codes[5]
+        finally:
+            columnar.CHUNK_ROWS = original
+
+    def test_table_matches_in_memory_table(self):
+        store = convert_export(io.BytesIO(EXPORT_CSV), self.store_directory)
+        table = store.table(usecols=['Q1', 'Q2'])
+        self.assertEqual(list(table.columns.keys()), ['Q1', 'Q2'])
+        expected = ResponseTable.from_export(io.BytesIO(EXPORT_CSV))
+        self.assertEqual(table.crosstab('Q1', 'Q2'), expected.crosstab('Q1', 'Q2'))
+
+    def test_high_cardinality_columns_are_stored_raw(self):
+        original = (columnar.CHUNK_ROWS, columnar.MAX_DICTIONARY_VALUES)
+        columnar.CHUNK_ROWS, columnar.MAX_DICTIONARY_VALUES = 2, 3
+        try:
+            store = convert_export(io.BytesIO(EXPORT_CSV), self.store_directory)
+        finally:
+            columnar.CHUNK_ROWS, columnar.MAX_DICTIONARY_VALUES = original
+        respondents = store.column('respondentId')
+        self.assertEqual(list(respondents), ['1', '2', '3', '4', '5'])
+        self.assertFalse(os.path.exists(os.path.join(self.store_directory, 'col_00000.codes')))
+        table = store.table()
+        expected = ResponseTable.from_export(io.BytesIO(EXPORT_CSV))
+        self.assertEqual(table.counts('respondentId', [{'questionId': 'Q1', 'responseId': 1}]),
+                         expected.counts('respondentId', [{'questionId': 'Q1', 'responseId': 1}]))
+        self.assertEqual(table.counts('Q2', [{'questionId': 'respondentId', 'responseId': 3}]),
+                         expected.counts('Q2', [{'questionId': 'respondentId', 'responseId': 3}]))
+        with self.assertRaises(CmixError):
+            table.crosstab('Q1', 'respondentId')
+
+    def test_unknown_column(self):
+        store = convert_export(io.BytesIO(EXPORT_CSV), self.store_directory)
+        with self.assertRaises(CmixError):
+            store.column('Q9')
+
+    def test_not_a_store(self):
+        with self.assertRaises(CmixError):
+            ColumnarStore(self.directory)
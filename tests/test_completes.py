@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import mock
+
+from unittest import TestCase
+from CmixAPIClient.api import CMIX_SERVICES
+from CmixAPIClient.completes import RespondentCounter
+from CmixAPIClient.error import CmixError
+from .test_api import default_cmix_api
+
+
+class TestRespondentCounter(TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.get_survey_respondents.return_value = [
+            {'id': 1, 'sourceId': 10, 'terminationCodeId': None},
+            {'id': 2, 'sourceId': 10, 'terminationCodeId': None},
+            {'id': 3, 'sourceId': 11, 'terminationCodeId': None},
+        ]
+        self.client.get_survey_sources.return_value = [{'id': 10, 'name': 'Panel'}, {'id': 11, 'name': 'Social'}]
+        self.client.get_survey_termination_codes.return_value = [{'id': 5, 'name': 'Overquota'}]
+
+    def test_refresh_counts_only_new_respondents(self):
+        counter = RespondentCounter(self.client, 1337)
+        self.assertEqual(counter.refresh(), 3)
+        self.client.get_survey_respondents.return_value.append({'id': 4, 'sourceId': 12})
+        self.assertEqual(counter.refresh(), 1)
+        self.assertEqual(counter.total, 4)
+        self.assertEqual(counter.counts_by_source(), {'Panel': 2, 'Social': 1, 12: 1})
+        self.client.get_survey_respondents.assert_called_with(1337, 'COMPLETE', True, extra_params=None)
+
+    def test_refresh_sends_cursor(self):
+        counter = RespondentCounter(self.client, 1337, respondent_type='TERMINATE', cursor_param='respondentIdAfter')
+        counter.refresh()
+        self.client.get_survey_respondents.return_value = [{'id': 7, 'sourceId': 10, 'terminationCodeId': 5}]
+        counter.refresh()
+        self.client.get_survey_respondents.assert_called_with(
+            1337, 'TERMINATE', True, extra_params=['respondentIdAfter=3']
+        )
+        self.assertEqual(counter.cursor, 7)
+        self.assertEqual(counter.counts_by_termination_code(), {None: 3, 'Overquota': 1})
+
+    def test_respondents_without_id_are_rejected(self):
+        self.client.get_survey_respondents.return_value = [{'sourceId': 10}, {'sourceId': 10}, {'sourceId': 11}]
+        counter = RespondentCounter(self.client, 1337)
+        with self.assertRaises(CmixError):
+            counter.refresh()
+        self.assertEqual(counter.total, 0)
+
+    def test_shared_labels_are_summed(self):
+        self.client.get_survey_sources.return_value = [{'id': 10, 'name': 'Panel'}, {'id': 11, 'name': 'Panel'}]
+        counter = RespondentCounter(self.client, 1337)
+        counter.refresh()
+        self.assertEqual(counter.counts_by_source(), {'Panel': 3})
+
+    def test_labels_fetched_once(self):
+        counter = RespondentCounter(self.client, 1337)
+        counter.refresh()
+        counter.counts_by_source()
+        counter.counts_by_termination_code()
+        self.assertEqual(self.client.get_survey_sources.call_count, 1)
+
+    def test_get_survey_respondents_extra_params(self):
+        cmix_api = default_cmix_api()
+        cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.return_value = mock.Mock(status_code=200)
+            cmix_api.get_survey_respondents(1337, 'COMPLETE', True, extra_params=['respondentIdAfter=3'])
+        expected_url = '{}/surveys/1337/respondents?respondentType=LIVE&respondentStatus=COMPLETE&respondentIdAfter=3'.format(
+            CMIX_SERVICES['reporting']['BASE_URL']
+        )
+        mock_request.get.assert_called_once_with(expected_url, headers=cmix_api._authentication_headers, timeout=5)
@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import mock
+import os
+import shutil
+import tempfile
+import threading
+
+from unittest import TestCase
+from CmixAPIClient.crawl import CrawlCoordinator, CrawlWorker
+
+
+class TestCrawl(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'crawl.db')
+        self.coordinator = CrawlCoordinator(self.path, shard_size=3, lease_seconds=60)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_plan_is_idempotent(self):
+        self.assertEqual(self.coordinator.plan(range(10)), 4)
+        other_node = CrawlCoordinator(self.path, shard_size=5)
+        self.assertEqual(other_node.plan(range(10)), 4)
+        self.assertEqual(CrawlCoordinator(self.path, crawl='other', shard_size=5).plan(range(10)), 2)
+
+    def test_leases_are_exclusive(self):
+        self.coordinator.plan(range(5))
+        first = self.coordinator.lease('a')
+        second = self.coordinator.lease('b')
+        self.assertEqual(first.items, [0, 1, 2])
+        self.assertEqual(second.items, [3, 4])
+        self.assertIsNone(self.coordinator.lease('c'))
+        self.assertEqual(self.coordinator.progress()['workers'], ['a', 'b'])
+
+    def test_expired_lease_is_reclaimed(self):
+        self.coordinator.plan(range(3))
+        lost = self.coordinator.lease('dead')
+        with mock.patch('CmixAPIClient.crawl.time.time', return_value=lost.expires + 1):
+            reclaimed = self.coordinator.lease('alive')
+            self.assertEqual(reclaimed.items, lost.items)
+            self.assertIsNone(self.coordinator.renew(lost))
+            self.assertFalse(self.coordinator.complete(lost, 3))
+            self.assertTrue(self.coordinator.complete(reclaimed, 3))
+        progress = self.coordinator.progress()
+        self.assertEqual(progress['items_done'], 3)
+        self.assertEqual(progress['done'], 1)
+        self.assertEqual(progress['workers'], [])
+
+    def test_release(self):
+        self.coordinator.plan(range(3))
+        lease = self.coordinator.lease('a')
+        self.assertTrue(self.coordinator.release(lease))
+        self.assertEqual(self.coordinator.lease('b').items, [0, 1, 2])
+
+    def test_workers_share_the_crawl(self):
+        self.coordinator.plan(range(20))
+        fetched = []
+        lock = threading.Lock()
+
+        def fetch(client, item_id):
+            if item_id == 7:
+                raise ValueError('broken survey')
+            with lock:
+                fetched.append(item_id)
+            return item_id
+
+        workers = [
+            CrawlWorker(CrawlCoordinator(self.path), None, fetch, worker_id=str(node), max_workers=2)
+            for node in range(3)
+        ]
+        threads = [threading.Thread(target=worker.run) for worker in workers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(sorted(fetched), [item for item in range(20) if item != 7])
+        progress = self.coordinator.progress()
+        self.assertEqual(progress['items'], 20)
+        self.assertEqual(progress['items_done'], 19)
+        self.assertEqual(progress['items_failed'], 1)
+        self.assertEqual(progress['done'], 7)
+
+    def test_failed_worker_releases_shard(self):
+        self.coordinator.plan(range(3))
+
+        def on_result(result):
+            raise KeyboardInterrupt()
+
+        worker = CrawlWorker(self.coordinator, None, lambda client, item_id: item_id, on_result=on_result)
+        with self.assertRaises(KeyboardInterrupt):
+            worker.run()
+        self.assertEqual(self.coordinator.progress()['pending'], 1)
+
+    def test_lease_is_renewed_during_slow_fetches(self):
+        coordinator = CrawlCoordinator(self.path, shard_size=3, lease_seconds=0.3)
+        coordinator.plan(range(3))
+        leased = []
+
+        def fetch(client, item_id):
+            # every fetch outlasts the lease
+            threading.Event().wait(0.45)
+            leased.append(coordinator.lease('other'))
+            return item_id
+
+        worker = CrawlWorker(coordinator, None, fetch, worker_id='slow', max_workers=3)
+        self.assertEqual(worker.run(), 1)
+        self.assertEqual(leased, [None, None, None])
+        self.assertEqual(coordinator.progress()['items_done'], 3)
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import mock
+
+from unittest import TestCase
+from CmixAPIClient.bulk import map_concurrently
+from CmixAPIClient.deadline import Deadline
+from CmixAPIClient.error import CmixError
+from .test_api import default_cmix_api
+
+
+class TestDeadline(TestCase):
+    def setUp(self):
+        self.cmix_api = default_cmix_api()
+        self.cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+
+    def test_deadline(self):
+        deadline = Deadline(10)
+        self.assertFalse(deadline.expired)
+        self.assertTrue(0 < deadline.remaining() <= 10)
+        deadline.check()
+        self.assertIsNone(Deadline().remaining())
+        with self.assertRaises(CmixError):
+            Deadline(0).check()
+
+    def test_cancel(self):
+        deadline = Deadline()
+        deadline.cancel()
+        self.assertTrue(deadline.wait(5))
+        with self.assertRaises(CmixError):
+            deadline.check()
+
+    def test_split_timeouts(self):
+        cmix_api = default_cmix_api()
+        cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+        cmix_api.connect_timeout = 2
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.return_value = mock.Mock(status_code=200)
+            cmix_api.get_survey_sources(1337)
+            self.assertEqual(mock_request.get.call_args[1]['timeout'], (2, 5))
+            with cmix_api.timeouts(read=30):
+                cmix_api.get_survey_sources(1337)
+            self.assertEqual(mock_request.get.call_args[1]['timeout'], (2, 30))
+            with cmix_api.timeouts(connect=5):
+                cmix_api.get_survey_sources(1337)
+            self.assertEqual(mock_request.get.call_args[1]['timeout'], 5)
+
+    def test_deadline_bounds_timeouts(self):
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.return_value = mock.Mock(status_code=200)
+            with self.cmix_api.deadline(1):
+                self.cmix_api.get_survey_sources(1337)
+            self.assertTrue(mock_request.get.call_args[1]['timeout'] <= 1)
+            self.cmix_api.get_survey_sources(1337)
+            self.assertEqual(mock_request.get.call_args[1]['timeout'], 5)
+
+    def test_deadline_spans_composite_calls(self):
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.post.return_value = mock.Mock(status_code=200)
+            mock_request.post.return_value.json.return_value = {'projectId': 1492}
+
+            def expire(*args, **kwargs):
+                job.expires = 0
+                return mock.DEFAULT
+            mock_request.post.side_effect = expire
+            with self.cmix_api.deadline(60) as job:
+                with self.assertRaises(CmixError):
+                    self.cmix_api.create_survey('<survey/>')
+            mock_request.patch.assert_not_called()
+
+    def test_cancel_discards_in_flight_response(self):
+        job = Deadline()
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            response = mock.Mock(status_code=200)
+            mock_request.get.side_effect = lambda *args, **kwargs: job.cancel() or response
+            with self.cmix_api.deadline(deadline=job):
+                with self.assertRaises(CmixError):
+                    self.cmix_api.get_survey_sources(1337)
+        response.close.assert_called_once_with()
+
+    def test_bulk_workers_inherit_deadline(self):
+        job = Deadline()
+        job.cancel()
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            with self.cmix_api.deadline(deadline=job):
+                results = list(map_concurrently(self.cmix_api.get_survey_sources, [1, 2], client=self.cmix_api))
+            mock_request.get.assert_not_called()
+        self.assertTrue(all(isinstance(result.error, CmixError) for result in results))
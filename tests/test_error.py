@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import mock
+
+from unittest import TestCase
+from requests.exceptions import ConnectionError, ConnectTimeout, RequestException
+from CmixAPIClient.deadline import Deadline
+from CmixAPIClient.error import (
+    CmixAuthError, CmixCancelledError, CmixConnectionError, CmixError, CmixNotFoundError, CmixServerError, CmixThrottledError,
+    CmixTimeoutError, MAX_MESSAGE_DETAIL, error_class_for_status
+)
+from .test_api import default_cmix_api
+
+
+def error_response(status_code, content=b'{"message": "nope"}'):
+    response = mock.Mock(status_code=status_code, content=content, url='https://survey-api.cmix.com/surveys/1')
+    response.json.return_value = {}
+    return response
+
+
+class TestCmixError(TestCase):
+    def setUp(self):
+        self.cmix_api = default_cmix_api()
+        self.cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+
+    def test_error_class_for_status(self):
+        self.assertIs(error_class_for_status(401), CmixAuthError)
+        self.assertIs(error_class_for_status(403), CmixAuthError)
+        self.assertIs(error_class_for_status(404), CmixNotFoundError)
+        self.assertIs(error_class_for_status(429), CmixThrottledError)
+        self.assertIs(error_class_for_status(504), CmixTimeoutError)
+        self.assertIs(error_class_for_status(503), CmixServerError)
+        self.assertIs(error_class_for_status(400), CmixError)
+        self.assertIs(error_class_for_status(None), CmixError)
+
+    def test_from_response(self):
+        error = CmixError.from_response(error_response(429), 'Slow down')
+        self.assertIsInstance(error, CmixThrottledError)
+        self.assertTrue(error.retryable)
+        self.assertEqual(error.status_code, 429)
+        self.assertEqual(error.url, 'https://survey-api.cmix.com/surveys/1')
+        self.assertEqual('{}'.format(error), 'Slow down: 429 and error {"message": "nope"}')
+        self.assertFalse(CmixError.from_response(error_response(404), 'Missing').retryable)
+
+    def test_message_is_formatted_lazily_and_truncated(self):
+        response = error_response(500, b'x' * (MAX_MESSAGE_DETAIL * 10))
+        error = CmixError.from_response(response, 'Broken', detail='<survey/>' * 1000)
+        response.json.assert_not_called()
+        message = '{}'.format(error)
+        self.assertTrue(message.startswith('Broken: 500 and error xxx'))
+        self.assertIn('[{} more bytes]'.format(MAX_MESSAGE_DETAIL * 9), message)
+        self.assertIn('when sent: <survey/>', message)
+        self.assertLess(len(message), MAX_MESSAGE_DETAIL * 3)
+
+    def test_api_errors_are_classified(self):
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.return_value = error_response(404)
+            with self.assertRaises(CmixNotFoundError):
+                self.cmix_api.get_survey_sources(1337)
+            mock_request.get.return_value = error_response(429)
+            with self.assertRaises(CmixThrottledError):
+                self.cmix_api.get_survey_locales(1337)
+            mock_request.post.return_value = error_response(401)
+            with self.assertRaises(CmixAuthError):
+                self.cmix_api.authenticate()
+
+    def test_transport_timeout(self):
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.side_effect = ConnectTimeout('timed out')
+            with self.assertRaises(CmixTimeoutError) as raised:
+                self.cmix_api.get_survey_sources(1337)
+            self.assertTrue(raised.exception.retryable)
+
+    def test_transport_errors_are_cmix_errors(self):
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.side_effect = ConnectionError('connection refused')
+            with self.assertRaises(CmixConnectionError) as raised:
+                self.cmix_api.get_survey_sources(1337)
+            self.assertTrue(raised.exception.retryable)
+            self.assertEqual(raised.exception.method, 'get')
+            mock_request.get.side_effect = RequestException('too many redirects')
+            with self.assertRaises(CmixError) as raised:
+                self.cmix_api.get_survey_sources(1337)
+            self.assertFalse(raised.exception.retryable)
+
+    def test_only_idempotent_requests_are_retryable(self):
+        response = error_response(503)
+        response.request.method = 'POST'
+        self.assertFalse(CmixError.from_response(response, 'Broken').retryable)
+        response.request.method = 'GET'
+        self.assertTrue(CmixError.from_response(response, 'Broken').retryable)
+        response = error_response(429)
+        response.request.method = 'POST'
+        self.assertTrue(CmixError.from_response(response, 'Slow down').retryable)
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.post.side_effect = ConnectTimeout('timed out')
+            with self.assertRaises(CmixTimeoutError) as raised:
+                self.cmix_api.create_survey('<survey/>')
+            self.assertFalse(raised.exception.retryable)
+
+    def test_deadline_errors(self):
+        with self.assertRaises(CmixTimeoutError):
+            Deadline(0).check()
+        deadline = Deadline()
+        deadline.cancel()
+        with self.assertRaises(CmixCancelledError):
+            deadline.check()
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import zipfile
+
+from unittest import TestCase
+from CmixAPIClient.error import CmixError
+from CmixAPIClient.export import iter_export_rows
+
+EXPORT_CSV = b'respondentId,Q1,Q2\r\n1,1,10\r\n2,2,"1,1"\r\n'
+
+
+class TestExport(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_iter_export_rows_file_object(self):
+        source = io.BytesIO(EXPORT_CSV)
+        rows = list(iter_export_rows(source))
+        self.assertEqual(rows, [['respondentId', 'Q1', 'Q2'], ['1', '1', '10'], ['2', '2', '1,1']])
+        self.assertFalse(source.closed)
+
+    def test_iter_export_rows_sniffs_delimiter(self):
+        rows = list(iter_export_rows(io.BytesIO(b'a\tb\n1\t2\n3\t4\n')))
+        self.assertEqual(rows, [['a', 'b'], ['1', '2'], ['3', '4']])
+
+    def test_iter_export_rows_sample_ending_inside_crlf(self):
+        # the 64 KiB sniffing sample ends between a \r and its \n
+        export = b'abc,d\r\n' + b'1,2\r\n' * 13107
+        self.assertEqual(export.index(b'\r', 64 * 1024 - 5), 64 * 1024 - 1)
+        rows = list(iter_export_rows(io.BytesIO(export)))
+        self.assertEqual(len(rows), 13108)
+        self.assertNotIn([], rows)
+
+    def test_iter_export_rows_non_ascii(self):
+        export = 'name;city\r\ncafé;Zürich\r\n'.encode('latin-1')
+        rows = list(iter_export_rows(io.BytesIO(export), encoding='latin-1'))
+        self.assertEqual(rows, [['name', 'city'], ['café', 'Zürich']])
+
+    def test_iter_export_rows_skips_blank_lines(self):
+        rows = list(iter_export_rows(io.BytesIO(b'a,b\r\n1,2\r\n\r\n3,4\r\n\r\n')))
+        self.assertEqual(rows, [['a', 'b'], ['1', '2'], ['3', '4']])
+
+    def test_iter_export_rows_zip_archive(self):
+        path = os.path.join(self.directory, 'archive.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('readme.md', 'not data')
+            archive.writestr('export.csv', EXPORT_CSV)
+        rows = list(iter_export_rows(path))
+        self.assertEqual(len(rows), 3)
+
+    def test_iter_export_rows_zip_without_data(self):
+        path = os.path.join(self.directory, 'archive.zip')
+        with zipfile.ZipFile(path, 'w') as archive:
+            archive.writestr('readme.md', 'not data')
+        with self.assertRaises(CmixError):
+            list(iter_export_rows(path))
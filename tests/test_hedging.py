@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import mock
+import threading
+
+from unittest import TestCase
+from CmixAPIClient.hedging import HedgePolicy
+from .test_api import default_cmix_api
+
+
+def primed_policy(**kwargs):
+    policy = HedgePolicy(min_samples=2, min_delay=0.01, **kwargs)
+    policy.record('host', 0.01)
+    policy.record('host', 0.01)
+    return policy
+
+
+class TestHedgePolicy(TestCase):
+    def test_delay_needs_samples(self):
+        policy = HedgePolicy(min_samples=2, min_delay=0.01)
+        self.assertIsNone(policy.delay('host'))
+        policy.record('host', 0.5)
+        policy.record('host', 0.1)
+        self.assertEqual(policy.delay('host'), 0.5)
+        self.assertIsNone(policy.delay('other-host'))
+
+    def test_fast_requests_are_not_hedged(self):
+        policy = primed_policy(max_ratio=1)
+        send = mock.Mock(return_value='response')
+        self.assertEqual(policy.execute('host', send), 'response')
+        self.assertEqual(send.call_count, 1)
+        self.assertEqual(policy.hedges, 0)
+
+    def test_slow_request_is_hedged(self):
+        policy = primed_policy(max_ratio=1)
+        release = threading.Event()
+        slow_response = mock.Mock()
+        fast_response = mock.Mock()
+        calls = []
+
+        def send():
+            calls.append(1)
+            if len(calls) == 1:
+                release.wait(1)
+                return slow_response
+            return fast_response
+
+        self.assertIs(policy.execute('host', send), fast_response)
+        self.assertEqual(policy.hedges, 1)
+        release.set()
+        policy.shutdown()
+        for _ in range(100):
+            if slow_response.close.called:
+                break
+            threading.Event().wait(0.01)
+        slow_response.close.assert_called_once_with()
+
+    def test_primaries_are_not_capped_by_the_hedge_workers(self):
+        policy = HedgePolicy(min_samples=1, min_delay=10, max_ratio=1, max_workers=2)
+        policy.record('host', 0.01)
+        lock = threading.Lock()
+        in_flight = []
+        peak = []
+
+        def send():
+            with lock:
+                in_flight.append(1)
+                peak.append(len(in_flight))
+            threading.Event().wait(0.1)
+            with lock:
+                in_flight.pop()
+            return 'response'
+
+        callers = [threading.Thread(target=policy.execute, args=('host', send)) for _ in range(8)]
+        for caller in callers:
+            caller.start()
+        for caller in callers:
+            caller.join()
+        self.assertEqual(max(peak), 8)
+
+    def test_budget_caps_hedges(self):
+        policy = primed_policy(max_ratio=0.5)
+        send = mock.Mock(side_effect=lambda: threading.Event().wait(0.05))
+        policy.execute('host', send)
+        self.assertEqual(policy.hedges, 0)
+        self.assertEqual(send.call_count, 1)
+
+    def test_hedge_used_when_primary_fails(self):
+        policy = primed_policy(max_ratio=1)
+        calls = []
+
+        def send():
+            calls.append(1)
+            if len(calls) == 1:
+                threading.Event().wait(0.05)
+                raise IOError('primary failed')
+            threading.Event().wait(0.1)
+            return 'hedge'
+
+        self.assertEqual(policy.execute('host', send), 'hedge')
+
+    def test_client_hedges_gets_only(self):
+        cmix_api = default_cmix_api()
+        cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+        cmix_api.hedge_policy = mock.Mock()
+        cmix_api.hedge_policy.execute.return_value = mock.Mock(status_code=200)
+        cmix_api.get_survey_sources(1337)
+        self.assertEqual(cmix_api.hedge_policy.execute.call_args[0][0], 'survey-api.cmix.com')
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.patch.return_value = mock.Mock(status_code=200)
+            cmix_api.update_project(1492, status='LIVE')
+        self.assertEqual(cmix_api.hedge_policy.execute.call_count, 1)
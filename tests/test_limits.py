@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import mock
+import threading
+
+from collections import deque
+from unittest import TestCase
+from CmixAPIClient.limits import (
+    AdaptiveConcurrencyLimiter, clock, CompositeLimiter, ConcurrencyLimiter, PriorityScheduler, RateLimiter,
+    PRIORITY_BATCH, PRIORITY_INTERACTIVE
+)
+from CmixAPIClient.deadline import Deadline
+from CmixAPIClient.error import CmixCancelledError, CmixError, CmixTimeoutError
+from .test_api import default_cmix_api
+
+
+class TestLimiters(TestCase):
+    def test_concurrency_limiter(self):
+        limiter = ConcurrencyLimiter(1)
+        limiter.acquire('survey-api.cmix.com')
+        with self.assertRaises(CmixTimeoutError):
+            limiter.acquire('survey-api.cmix.com', deadlines=[Deadline(0.01)])
+        limiter.release('survey-api.cmix.com', 200, 0.1)
+        limiter.acquire('survey-api.cmix.com', deadlines=[Deadline(0.01)])
+        self.assertEqual(limiter.in_flight, 1)
+
+    def test_rate_limiter_waits_for_tokens(self):
+        limiter = RateLimiter(2, burst=2)
+        with mock.patch('CmixAPIClient.limits.clock', return_value=100.0):
+            limiter._updated = 100.0
+            limiter.acquire('host')
+            limiter.acquire('host')
+            self.assertEqual(limiter._wait_time(), 0.5)
+
+    def test_composite_limiter_releases_on_failure(self):
+        first = mock.Mock()
+        second = mock.Mock()
+        second.acquire.side_effect = KeyboardInterrupt
+        limiter = CompositeLimiter([first, second])
+        with self.assertRaises(KeyboardInterrupt):
+            limiter.acquire('host')
+        first.release.assert_called_once_with('host', None, None)
+
+    def test_rate_limiter_wakes_on_cancel(self):
+        limiter = RateLimiter(0.01, burst=1)
+        limiter.acquire('host')
+        job = Deadline()
+        threading.Timer(0.05, job.cancel).start()
+        started = clock()
+        with self.assertRaises(CmixCancelledError):
+            limiter.acquire('host', deadlines=[job])
+        self.assertLess(clock() - started, 5)
+
+    def test_full_limiter_respects_the_deadline(self):
+        cmix_api = default_cmix_api()
+        cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+        cmix_api.limiter = ConcurrencyLimiter(1)
+        cmix_api.limiter.acquire('survey-api.cmix.com')
+        threading.Timer(1, cmix_api.limiter.release, ('survey-api.cmix.com', 200, 1)).start()
+        started = clock()
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            with cmix_api.deadline(0.2):
+                with self.assertRaises(CmixTimeoutError):
+                    cmix_api.get_survey_sources(1337)
+            mock_request.get.assert_not_called()
+        self.assertLess(clock() - started, 0.9)
+
+    def test_timeout_is_recomputed_after_waiting(self):
+        cmix_api = default_cmix_api()
+        cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+        cmix_api.limiter = ConcurrencyLimiter(1)
+        cmix_api.limiter.acquire('survey-api.cmix.com')
+        threading.Timer(0.3, cmix_api.limiter.release, ('survey-api.cmix.com', 200, 1)).start()
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.return_value = mock.Mock(status_code=200)
+            with cmix_api.deadline(1):
+                cmix_api.get_survey_sources(1337)
+        self.assertLess(mock_request.get.call_args[1]['timeout'], 0.8)
+
+    def test_client_requests_pass_through_limiter(self):
+        cmix_api = default_cmix_api()
+        cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+        cmix_api.limiter = mock.Mock()
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.return_value = mock.Mock(status_code=200)
+            cmix_api.get_survey_sources(1337)
+        cmix_api.limiter.acquire.assert_called_once_with('survey-api.cmix.com', 'normal')
+        self.assertEqual(cmix_api.limiter.release.call_args[0][:2], ('survey-api.cmix.com', 200))
+
+    def test_limiter_released_when_request_raises(self):
+        cmix_api = default_cmix_api()
+        cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+        cmix_api.limiter = mock.Mock()
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.side_effect = IOError
+            with self.assertRaises(IOError):
+                cmix_api.get_survey_sources(1337)
+        self.assertEqual(cmix_api.limiter.release.call_args[0][:2], ('survey-api.cmix.com', None))
+
+
+class TestAdaptiveConcurrencyLimiter(TestCase):
+    def test_additive_increase(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=2, maximum=3)
+        for _ in range(10):
+            limiter.acquire('host')
+            limiter.release('host', 200, 0.1)
+        self.assertEqual(limiter.limit('host'), 3)
+        self.assertEqual(limiter.limit('other-host'), 2)
+
+    def test_multiplicative_decrease_once_per_round_trip(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=8, minimum=2)
+        with mock.patch('CmixAPIClient.limits.clock', return_value=100.0):
+            for _ in range(3):
+                limiter.acquire('host')
+            limiter.release('host', 429, 1.0)
+            limiter.release('host', 503, 1.0)
+            limiter.release('host', None, 1.0)
+        self.assertEqual(limiter.limit('host'), 4)
+        with mock.patch('CmixAPIClient.limits.clock', return_value=200.0):
+            for _ in range(2):
+                limiter.acquire('host')
+                limiter.release('host', 500, 1.0)
+        self.assertEqual(limiter.limit('host'), 2)
+
+    def test_slow_responses_back_off(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=4, tolerance=2.0)
+        limiter.acquire('host')
+        limiter.release('host', 200, 1.0)
+        limiter.acquire('host')
+        limiter.release('host', 200, 5.0)
+        self.assertEqual(limiter.limit('host'), 2)
+        limiter = AdaptiveConcurrencyLimiter(initial=4, latency_target=0.5)
+        limiter.acquire('host')
+        limiter.release('host', 200, 1.0)
+        self.assertEqual(limiter.limit('host'), 2)
+
+    def test_latency_shift_is_absorbed(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=8, maximum=16)
+        clock_value = [0.0]
+
+        def respond(elapsed):
+            clock_value[0] += elapsed
+            limiter.acquire('host')
+            limiter.release('host', 200, elapsed)
+
+        with mock.patch('CmixAPIClient.limits.clock', side_effect=lambda: clock_value[0]):
+            for _ in range(200):
+                respond(0.1)
+            limits = []
+            for _ in range(2000):
+                respond(0.5)
+                limits.append(limiter.limit('host'))
+        # the sudden rise backs off first, then the limit recovers at the new latency
+        self.assertLess(min(limits), 16)
+        window = limiter._window('host')
+        self.assertAlmostEqual(window.baseline, 0.5)
+        self.assertEqual(limiter.limit('host'), 16)
+
+    def test_acquire_blocks_at_limit(self):
+        limiter = AdaptiveConcurrencyLimiter(initial=1)
+        limiter.acquire('host')
+        acquired = threading.Event()
+        waiter = threading.Thread(target=lambda: (limiter.acquire('host'), acquired.set()))
+        waiter.start()
+        self.assertFalse(acquired.wait(0.05))
+        limiter.release('host', 200, 0.1)
+        self.assertTrue(acquired.wait(1))
+        waiter.join()
+
+
+class TestPriorityScheduler(TestCase):
+    def wait_for_queue(self, scheduler, priority, length):
+        for _ in range(200):
+            if scheduler.queued(priority) == length:
+                return
+            threading.Event().wait(0.005)
+        self.fail('{} queue never reached {}'.format(priority, length))
+
+    def test_interactive_requests_skip_the_batch_queue(self):
+        scheduler = PriorityScheduler(1)
+        scheduler.acquire('host', PRIORITY_BATCH)
+        order = []
+
+        def request(priority):
+            scheduler.acquire('host', priority)
+            order.append(priority)
+            scheduler.release('host', 200, 0.1)
+
+        threads = []
+        for priority, queued in [(PRIORITY_BATCH, 1), (PRIORITY_BATCH, 2), (PRIORITY_INTERACTIVE, 1)]:
+            thread = threading.Thread(target=request, args=(priority, ))
+            thread.start()
+            threads.append(thread)
+            self.wait_for_queue(scheduler, priority, queued)
+        scheduler.release('host', 200, 0.1)
+        for thread in threads:
+            thread.join(1)
+        self.assertEqual(order, [PRIORITY_INTERACTIVE, PRIORITY_BATCH, PRIORITY_BATCH])
+
+    def test_weighted_fair_share(self):
+        scheduler = PriorityScheduler(1, weights={'a': 3, 'b': 1})
+        scheduler.in_flight = 1
+        tickets = dict((name, deque(object() for _ in range(8))) for name in ('a', 'b'))
+        scheduler._queues.update((name, deque(queue)) for name, queue in tickets.items())
+        granted = []
+        for _ in range(8):
+            with scheduler._condition:
+                scheduler.in_flight -= 1
+                scheduler._dispatch()
+                ticket = scheduler._granted.pop()
+            granted.append('a' if ticket in tickets['a'] else 'b')
+        self.assertEqual(granted.count('a'), 6)
+        self.assertEqual(granted.count('b'), 2)
+
+    def test_expired_ticket_leaves_the_queue(self):
+        scheduler = PriorityScheduler(1)
+        scheduler.acquire('host', PRIORITY_BATCH)
+        with self.assertRaises(CmixTimeoutError):
+            scheduler.acquire('host', PRIORITY_INTERACTIVE, deadlines=[Deadline(0.01)])
+        self.assertEqual(scheduler.queued(PRIORITY_INTERACTIVE), 0)
+        scheduler.release('host', 200, 0.1)
+        self.assertEqual(scheduler.in_flight, 0)
+
+    def test_custom_weights_keep_the_default_classes(self):
+        scheduler = PriorityScheduler(2, weights={PRIORITY_INTERACTIVE: 8, PRIORITY_BATCH: 2})
+        scheduler.acquire('host', 'normal')
+        self.assertEqual(scheduler.in_flight, 1)
+        self.assertEqual(scheduler.weights, {PRIORITY_INTERACTIVE: 8, 'normal': 4, PRIORITY_BATCH: 2})
+        with self.assertRaises(CmixError):
+            PriorityScheduler(2, weights={'a': 1}, default_priority='b')
+
+    def test_unknown_priority_uses_default(self):
+        rate_limiter = mock.Mock()
+        scheduler = PriorityScheduler(2, rate_limiter=rate_limiter)
+        scheduler.acquire('host', 'unknown')
+        self.assertEqual(scheduler.in_flight, 1)
+        rate_limiter.acquire.assert_called_once_with('host', 'unknown')
+
+    def test_client_method_priorities(self):
+        cmix_api = default_cmix_api()
+        cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+        cmix_api.limiter = mock.Mock()
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_request.get.return_value = mock.Mock(status_code=200)
+            mock_request.get.return_value.json.return_value = {'status': 'LIVE', 'testToken': 'token'}
+            cmix_api.get_survey_status(1337)
+            self.assertEqual(cmix_api.limiter.acquire.call_args[0][1], PRIORITY_INTERACTIVE)
+            cmix_api.get_survey_completes(1337)
+            self.assertEqual(cmix_api.limiter.acquire.call_args[0][1], PRIORITY_BATCH)
+            with cmix_api.priority(PRIORITY_BATCH):
+                cmix_api.get_survey_test_url(1337)
+            self.assertEqual(cmix_api.limiter.acquire.call_args[0][1], PRIORITY_BATCH)
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import os
+import shutil
+import tempfile
+import threading
+
+from unittest import TestCase
+from CmixAPIClient.columnar import ColumnarStore
+from CmixAPIClient.error import CmixError
+from CmixAPIClient.pipeline import convert_export_task, ProcessingPipeline, response_counts_task
+from .test_tabulation import EXPORT_CSV
+
+
+def square(value):
+    if value < 0:
+        raise ValueError('negative')
+    return value * value
+
+
+class TestProcessingPipeline(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.export_path = os.path.join(self.directory, 'export.csv')
+        with io.open(self.export_path, 'wb') as fh:
+            fh.write(EXPORT_CSV)
+        self.pipeline = ProcessingPipeline(max_workers=2)
+
+    def tearDown(self):
+        self.pipeline.close()
+        shutil.rmtree(self.directory)
+
+    def test_map(self):
+        results = dict((result.item, result) for result in self.pipeline.map(square, [1, 2, -3]))
+        self.assertEqual(results[2].result, 4)
+        self.assertIsInstance(results[-3].error, ValueError)
+
+    def test_fetch_and_process(self):
+        def fetch(survey_id):
+            if survey_id == 3:
+                raise CmixError('not found')
+            return survey_id + 1
+
+        results = dict(
+            (result.item, result) for result in self.pipeline.fetch_and_process(fetch, square, [1, 2, 3], max_fetchers=2)
+        )
+        self.assertEqual(results[1].result, 4)
+        self.assertEqual(results[2].result, 9)
+        self.assertIsInstance(results[3].error, CmixError)
+
+    def test_backpressure(self):
+        pipeline = ProcessingPipeline(max_workers=1, max_pending=2)
+        taken = []
+        lock = threading.Lock()
+
+        def items():
+            for item in range(10):
+                with lock:
+                    taken.append(item)
+                yield item
+
+        results = pipeline.map(square, items())
+        next(results)
+        # one result consumed: at most max_pending more items have been taken
+        self.assertLessEqual(len(taken), 3)
+        self.assertEqual(len(list(results)), 9)
+        pipeline.close()
+
+    def test_export_tasks(self):
+        store_directory = os.path.join(self.directory, 'store')
+        jobs = [(self.export_path, store_directory, 7)]
+        self.assertEqual([result.result for result in self.pipeline.map(convert_export_task, jobs)], [store_directory])
+        self.assertEqual(ColumnarStore(store_directory).data_layout_id, 7)
+
+        counts = list(self.pipeline.map(response_counts_task, [(self.export_path, [{'questionId': 'Q1'}])]))
+        self.assertEqual(counts[0].result[0]['total'], 5)
@@ -0,0 +1,114 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import mock
+import threading
+
+from unittest import TestCase
+from CmixAPIClient.limits import CompositeLimiter, PriorityScheduler, PRIORITY_BATCH, PRIORITY_INTERACTIVE
+from CmixAPIClient.pool import CmixClientPool
+
+CREDENTIALS = ('test_username', 'test_password', 'test_client_id', 'test_client_secret')
+
+
+def auth_response():
+    response = mock.Mock(status_code=200)
+    response.json.return_value = {'token_type': 'Bearer', 'access_token': 'tokentokentoken'}
+    return response
+
+
+class TestCmixClientPool(TestCase):
+    def setUp(self):
+        self.session = mock.Mock()
+        self.session.post.return_value = auth_response()
+
+    def test_clients_are_reused_and_share_the_session(self):
+        pool = CmixClientPool(session=self.session)
+        client = pool.get_client(*CREDENTIALS)
+        self.assertIs(pool.get_client(*CREDENTIALS), client)
+        other = pool.get_client('other', 'test_password', 'test_client_id', 'test_client_secret')
+        self.assertIsNot(other, client)
+        self.assertIs(other.session, client.session)
+        self.assertEqual(self.session.post.call_count, 2)
+        self.assertEqual(client._authentication_headers, {'Authorization': 'Bearer tokentokentoken'})
+
+    def test_limiters(self):
+        pool = CmixClientPool(session=self.session)
+        self.assertIsNone(pool.get_client(*CREDENTIALS).limiter)
+        pool = CmixClientPool(session=self.session, max_concurrency=10, rate_limit=5, tenant_max_concurrency=2)
+        first = pool.get_client(*CREDENTIALS).limiter
+        second = pool.get_client('other', 'test_password', 'test_client_id', 'test_client_secret').limiter
+        self.assertIsInstance(first, CompositeLimiter)
+        self.assertEqual(len(first.limiters), 2)
+        self.assertIsNot(first.limiters[0], second.limiters[0])
+        self.assertIsInstance(first.limiters[0], PriorityScheduler)
+        self.assertIsNone(first.limiters[0].rate_limiter)
+        self.assertIs(first.limiters[1], second.limiters[1])
+        self.assertIsInstance(first.limiters[1], PriorityScheduler)
+        self.assertIsNotNone(first.limiters[1].rate_limiter)
+
+    def test_tenant_slots_are_scheduled_by_priority(self):
+        pool = CmixClientPool(session=self.session, tenant_max_concurrency=1, tenant_rate_limit=100)
+        tenant = pool.get_client(*CREDENTIALS).limiter.limiters[0]
+        self.assertIsInstance(tenant, PriorityScheduler)
+        self.assertIsNotNone(tenant.rate_limiter)
+        tenant.acquire('host', PRIORITY_BATCH)
+        order = []
+
+        def request(priority):
+            tenant.acquire('host', priority)
+            order.append(priority)
+            tenant.release('host', 200, 0.1)
+
+        threads = []
+        for priority in (PRIORITY_BATCH, PRIORITY_INTERACTIVE):
+            thread = threading.Thread(target=request, args=(priority, ))
+            thread.start()
+            threads.append(thread)
+            while not tenant.queued(priority):
+                threading.Event().wait(0.005)
+        tenant.release('host', 200, 0.1)
+        for thread in threads:
+            thread.join(1)
+        self.assertEqual(order, [PRIORITY_INTERACTIVE, PRIORITY_BATCH])
+
+    def test_idle_tenants_are_evicted(self):
+        pool = CmixClientPool(session=self.session, idle_seconds=60)
+        with mock.patch('CmixAPIClient.pool.clock', return_value=1000), \
+                mock.patch('CmixAPIClient.api.clock', return_value=1000):
+            client = pool.get_client(*CREDENTIALS)
+        with mock.patch('CmixAPIClient.pool.clock', return_value=1100):
+            pool.evict_idle()
+            self.assertEqual(len(pool), 0)
+            self.assertIsNot(pool.get_client(*CREDENTIALS), client)
+
+    def test_clients_in_use_are_not_evicted(self):
+        pool = CmixClientPool(session=self.session, idle_seconds=60)
+        with mock.patch('CmixAPIClient.pool.clock', return_value=1000), \
+                mock.patch('CmixAPIClient.api.clock', return_value=1000):
+            client = pool.get_client(*CREDENTIALS)
+
+        def slow_request(url, **kwargs):
+            # the request outlasts idle_seconds
+            with mock.patch('CmixAPIClient.pool.clock', return_value=1100):
+                self.assertIs(pool.get_client(*CREDENTIALS), client)
+            return mock.Mock(status_code=200, json=mock.Mock(return_value={'status': 'LIVE'}))
+
+        self.session.get.side_effect = slow_request
+        with mock.patch('CmixAPIClient.api.clock', return_value=1100):
+            client.get_survey_status(1337)
+        with mock.patch('CmixAPIClient.pool.clock', return_value=1150):
+            self.assertIs(pool.get_client(*CREDENTIALS), client)
+        self.assertEqual(self.session.post.call_count, 1)
+
+    def test_close(self):
+        pool = CmixClientPool(session=self.session)
+        pool.get_client(*CREDENTIALS)
+        pool.close()
+        self.assertEqual(len(pool), 0)
+        self.session.close.assert_called_once_with()
+
+    def test_default_session_refuses_cookies(self):
+        pool = CmixClientPool(max_connections=4)
+        self.assertEqual(pool.session.get_adapter('https://survey-api.cmix.com')._pool_maxsize, 4)
+        self.assertEqual(tuple(pool.session.cookies._policy.allowed_domains()), ())
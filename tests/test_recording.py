@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import gzip
+import json
+import mock
+import os
+import shutil
+import tempfile
+
+from unittest import TestCase
+from CmixAPIClient.api import CmixAPI
+from CmixAPIClient.error import CmixError
+from CmixAPIClient.recording import RecordingSession, ReplaySession
+
+
+def recorded_response(body, status_code=200):
+    response = mock.Mock(status_code=status_code, content=body, headers={'Content-Type': 'application/json'})
+    response.json.side_effect = lambda: json.loads(body.decode('utf-8'))
+    return response
+
+
+def cmix_api(session):
+    return CmixAPI(
+        username="test_username",
+        password="test_password",
+        client_id="test_client_id",
+        client_secret="test_client_secret",
+        timeout=5,
+        session=session
+    )
+
+
+class TestRecording(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'capture.jsonl.gz')
+        self.inner = mock.Mock()
+        auth = recorded_response(b'{"token_type": "Bearer", "access_token": "secret-token"}')
+        auth.headers['Set-Cookie'] = 'session=secret-cookie'
+        self.inner.request.side_effect = [
+            auth,
+            recorded_response(b'[{"id": 1, "name": "Panel"}]'),
+            recorded_response(b'\xff\xfe<survey/>'),
+        ]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def record(self):
+        session = RecordingSession(self.path, session=self.inner)
+        client = cmix_api(session)
+        client.authenticate()
+        client.get_survey_sources(1337)
+        client.get_survey_xml(1337)
+        session.close()
+
+    def test_recording_redacts_credentials(self):
+        self.record()
+        with gzip.open(self.path, 'rb') as fh:
+            entries = [json.loads(line.decode('utf-8')) for line in fh]
+        self.assertEqual(len(entries), 3)
+        self.assertEqual(entries[0]['request']['json']['password'], 'REDACTED')
+        self.assertEqual(entries[0]['request']['json']['username'], 'REDACTED')
+        self.assertEqual(entries[0]['request']['json']['client_id'], 'REDACTED')
+        self.assertEqual(entries[0]['request']['bytes'], len(json.dumps({
+            'grant_type': 'password',
+            'client_id': 'test_client_id',
+            'client_secret': 'test_client_secret',
+            'username': 'test_username',
+            'password': 'test_password',
+        })))
+        self.assertEqual(entries[0]['headers']['Set-Cookie'], 'REDACTED')
+        self.assertEqual(entries[0]['headers']['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(entries[0]['body'])['access_token'], 'REDACTED')
+        self.assertEqual(entries[1]['request']['headers']['Authorization'], 'REDACTED')
+        self.assertEqual(entries[1]['bytes'], 28)
+        self.assertEqual(entries[1]['request']['bytes'], 0)
+        self.assertEqual(entries[2]['encoding'], 'base64')
+        capture = gzip.open(self.path, 'rb').read().decode('utf-8')
+        for secret in ('secret-token', 'secret-cookie', 'test_username', 'test_client_id'):
+            self.assertNotIn(secret, capture)
+
+    def test_replay(self):
+        self.record()
+        client = cmix_api(ReplaySession(self.path, latency_scale=0))
+        client.authenticate()
+        self.assertEqual(client._authentication_headers, {'Authorization': 'Bearer REDACTED'})
+        self.assertEqual(client.get_survey_sources(1337), [{'id': 1, 'name': 'Panel'}])
+        self.assertEqual(client.get_survey_sources(1337), [{'id': 1, 'name': 'Panel'}])
+        self.assertEqual(client.get_survey_xml(1337), b'\xff\xfe<survey/>')
+        with self.assertRaises(CmixError):
+            client.get_survey_locales(1337)
+
+    def test_replay_scales_latency(self):
+        self.record()
+        session = ReplaySession(self.path, latency_scale=2)
+        with mock.patch('CmixAPIClient.recording.time.sleep') as mock_sleep:
+            session.get('https://file-processing.cmix.com/surveys/1337')
+        recorded = session._entries[('get', 'https://file-processing.cmix.com/surveys/1337')][0]['elapsed']
+        mock_sleep.assert_called_once_with(recorded * 2)
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import json
+import mock
+import os
+import shutil
+import tempfile
+import time
+
+from unittest import TestCase
+from CmixAPIClient.buffering import ResponseBody
+from CmixAPIClient.error import CmixServerError
+from CmixAPIClient.store import DEFAULT_MAX_AGE, DocumentStore, KIND_DEFINITION, KIND_XML
+from .test_buffering import buffered_cmix_api, streamed_response
+
+
+def body(content):
+    response_body = ResponseBody()
+    response_body.write(content)
+    response_body.seek(0)
+    return response_body
+
+
+class TestDocumentStore(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.client = mock.Mock()
+        self.client.api_get.return_value = {'id': 1337, 'status': 'LIVE', 'name': 'Survey'}
+        self.client.get_survey_xml.side_effect = lambda survey_id, as_file: body(b'<survey/>')
+        self.client.get_survey_definition.side_effect = lambda survey_id, as_file: body(b'{"questions": []}')
+        self.store = DocumentStore(self.directory, self.client)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def objects(self):
+        return [name for _, _, names in os.walk(os.path.join(self.directory, 'objects')) for name in names]
+
+    def test_documents_are_fetched_once_per_change(self):
+        self.assertEqual(self.store.get_survey_xml(1337), b'<survey/>')
+        self.assertEqual(self.store.get_survey_xml(1337), b'<survey/>')
+        self.assertEqual(self.client.get_survey_xml.call_count, 1)
+        self.client.api_get.assert_called_with('surveys/1337')
+
+        self.client.api_get.return_value = {'id': 1337, 'status': 'CLOSED'}
+        self.store.get_survey_xml(1337)
+        self.assertEqual(self.client.get_survey_xml.call_count, 2)
+
+    def test_definitions(self):
+        self.assertEqual(self.store.get_survey_definition(1337), {'questions': []})
+        self.assertEqual(self.store.get_survey_definition(1337), {'questions': []})
+        self.assertEqual(self.client.get_survey_definition.call_count, 1)
+
+    def test_identical_documents_are_stored_once(self):
+        self.store.get_survey_xml(1)
+        self.store.get_survey_xml(2)
+        self.assertEqual(len(self.objects()), 1)
+        self.assertEqual(self.store.entry(1, KIND_XML)['digest'], self.store.entry(2, KIND_XML)['digest'])
+
+    def test_max_age(self):
+        store = DocumentStore(self.directory, self.client, max_age=60)
+        store.get_survey_xml(1337)
+        with mock.patch('CmixAPIClient.store.time.time', return_value=time.time() + 120):
+            store.get_survey_xml(1337)
+        self.assertEqual(self.client.get_survey_xml.call_count, 2)
+
+    def test_status_only_validators_expire(self):
+        self.store.get_survey_xml(1337)
+        with mock.patch('CmixAPIClient.store.time.time', return_value=time.time() + DEFAULT_MAX_AGE + 1):
+            self.store.get_survey_xml(1337)
+        self.assertEqual(self.client.get_survey_xml.call_count, 2)
+
+    def test_error_responses_are_not_stored(self):
+        cmix_api = buffered_cmix_api()
+        store = DocumentStore(self.directory, cmix_api)
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            survey = mock.Mock(status_code=200)
+            survey.json.return_value = {'id': 1337, 'status': 'DESIGN'}
+            failed = streamed_response(b'Internal error')
+            failed.status_code = 500
+            failed.content = b'Internal error'
+            mock_request.get.side_effect = [survey, failed, survey, streamed_response(b'<survey/>')]
+            with self.assertRaises(CmixServerError):
+                store.get_survey_xml(1337)
+            failed.close.assert_called_once_with()
+            self.assertIsNone(store.entry(1337, KIND_XML))
+            self.assertEqual(store.get_survey_xml(1337), b'<survey/>')
+
+    def test_stores_share_a_directory(self):
+        self.store.put(1337, KIND_DEFINITION, b'{"questions": [1]}', validator='v1')
+        other = DocumentStore(self.directory)
+        self.assertEqual(json.loads(other.get(1337, KIND_DEFINITION).decode('utf-8')), {'questions': [1]})
+        self.assertIsNone(other.get(1337, KIND_XML))
+        self.assertFalse([name for name in self.objects() if name.startswith('.tmp-')])
+
+    def test_prune(self):
+        self.store.put(1337, KIND_XML, b'<old/>')
+        self.store.put(1337, KIND_XML, b'<new/>')
+        self.assertEqual(self.store.prune(), 0)
+        self.assertEqual(self.store.prune(grace_seconds=-1), 1)
+        self.assertEqual(self.store.get(1337, KIND_XML), b'<new/>')
@@ -0,0 +1,103 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+import mock
+
+from xml.etree import ElementTree
+from unittest import TestCase
+from CmixAPIClient.error import CmixError
+from CmixAPIClient.survey_xml import parse_survey_xml, SurveyIndexCache
+from .test_api import default_cmix_api
+
+SURVEY_XML = b'''<?xml version="1.0" encoding="UTF-8"?>
+<survey id="1337">
+    <questions>
+        <question id="101" name="Q1" type="single">
+            <text>Do you like surveys?</text>
+            <response id="1" name="Yes"/>
+            <response id="2" name="No"/>
+        </question>
+        <question id="102" name="Q2" type="single">
+            <option id="10">Red</option>
+            <option id="11">Blue</option>
+            <option id="12">Green</option>
+        </question>
+    </questions>
+</survey>
+'''
+
+
+class TestSurveyXML(TestCase):
+    def test_parse_survey_xml(self):
+        index = parse_survey_xml(SURVEY_XML, survey_id=1337)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(list(index.questions.keys()), [101, 102])
+        self.assertEqual(index.get_question('Q1').type, 'single')
+        self.assertEqual(index.response_ids(101), [1, 2])
+        self.assertEqual([response.name for response in index.get_question(102).responses], ['Red', 'Blue', 'Green'])
+
+    def test_parse_survey_xml_file_object(self):
+        index = parse_survey_xml(io.BytesIO(SURVEY_XML))
+        self.assertIn(102, index)
+
+    def test_finished_questions_are_detached(self):
+        iterparse = ElementTree.iterparse
+        left = []
+
+        def recording_iterparse(source, events=None):
+            for event, elem in iterparse(source, events=events):
+                if event == 'end' and elem.tag == 'questions':
+                    left.append(len(elem))
+                yield event, elem
+
+        xml = b'<survey><questions>' + b''.join(
+            '<question id="{0}"><response id="1"/></question>'.format(question_id).encode('ascii')
+            for question_id in range(50)
+        ) + b'</questions></survey>'
+        with mock.patch('CmixAPIClient.survey_xml.ElementTree.iterparse', side_effect=recording_iterparse):
+            self.assertEqual(len(parse_survey_xml(xml)), 50)
+        self.assertEqual(left, [0])
+
+    def test_parse_survey_xml_errors_handled(self):
+        with self.assertRaises(CmixError):
+            parse_survey_xml(b'<survey><question id="1">')
+
+    def test_unknown_question(self):
+        index = parse_survey_xml(SURVEY_XML)
+        with self.assertRaises(CmixError):
+            index.get_question(999)
+
+    def test_raw_results_payload(self):
+        index = parse_survey_xml(SURVEY_XML)
+        self.assertEqual(index.raw_results_payload(), [{'questionId': 101}, {'questionId': 102}])
+        self.assertEqual(index.raw_results_payload(['Q2']), [{'questionId': 102}])
+
+    def test_crosstab_payloads(self):
+        index = parse_survey_xml(SURVEY_XML)
+        payloads = index.crosstab_payloads('Q1', 'Q2')
+        self.assertEqual(len(payloads), 3)
+        self.assertEqual(payloads[0]['counts'], [{'questionId': 101, 'resolution': 1}])
+        self.assertEqual(payloads[2]['filters'], [{'questionId': 102, 'responseId': 12}])
+
+    def test_cache_evicts_least_recently_used(self):
+        cache = SurveyIndexCache(max_entries=1)
+        first = cache.get_or_parse(1, SURVEY_XML)
+        self.assertIs(cache.get_or_parse(1, SURVEY_XML), first)
+        cache.get_or_parse(2, SURVEY_XML)
+        self.assertIsNone(cache.get(1, first.digest))
+
+    def test_get_survey_index(self):
+        cmix_api = default_cmix_api()
+        cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+        with mock.patch('CmixAPIClient.api.requests') as mock_request:
+            mock_response = mock.Mock()
+            mock_response.status_code = 200
+            mock_response.content = SURVEY_XML
+            mock_request.get.return_value = mock_response
+
+            index = cmix_api.get_survey_index(1337)
+            self.assertEqual(index.survey_id, 1337)
+            with mock.patch('CmixAPIClient.survey_xml.parse_survey_xml') as mock_parse:
+                self.assertIs(cmix_api.get_survey_index(1337), index)
+                mock_parse.assert_not_called()
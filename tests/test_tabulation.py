@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import io
+
+from unittest import TestCase
+from CmixAPIClient.error import CmixError
+from CmixAPIClient.survey_xml import parse_survey_xml
+from CmixAPIClient.tabulation import ResponseTable
+from .test_survey_xml import SURVEY_XML
+
+EXPORT_CSV = b'''respondentId,Q1,Q2
+1,1,10
+2,1,11
+3,2,10
+4,2,
+5,1,10
+'''
+
+
+class TestResponseTable(TestCase):
+    def setUp(self):
+        self.table = ResponseTable.from_export(io.BytesIO(EXPORT_CSV))
+
+    def test_from_export(self):
+        self.assertEqual(len(self.table), 5)
+        self.assertEqual(list(self.table.columns.keys()), ['respondentId', 'Q1', 'Q2'])
+
+    def test_from_export_usecols(self):
+        table = ResponseTable.from_export(io.BytesIO(EXPORT_CSV), usecols=['Q2'])
+        self.assertEqual(list(table.columns.keys()), ['Q2'])
+
+    def test_from_empty_export(self):
+        with self.assertRaises(CmixError):
+            ResponseTable.from_export(io.BytesIO(b''))
+
+    def test_counts(self):
+        counts = self.table.counts('Q2')
+        self.assertEqual(counts['total'], 4)
+        self.assertEqual(counts['counts'], [{'responseId': 10, 'count': 3}, {'responseId': 11, 'count': 1}])
+
+    def test_counts_filtered(self):
+        counts = self.table.counts('Q2', [{'questionId': 'Q1', 'responseId': 1}])
+        self.assertEqual(counts['counts'], [{'responseId': 10, 'count': 2}, {'responseId': 11, 'count': 1}])
+        counts = self.table.counts('Q2', [
+            {'questionId': 'Q1', 'responseId': [1, 2]},
+            {'questionId': 'Q2', 'responseId': 10},
+        ])
+        self.assertEqual(counts['total'], 3)
+
+    def test_unknown_question(self):
+        with self.assertRaises(CmixError):
+            self.table.counts('Q9')
+
+    def test_response_counts_payloads(self):
+        raw = self.table.response_counts([{'questionId': 'Q1'}, {'questionId': 'Q2'}])
+        self.assertEqual([result['questionId'] for result in raw], ['Q1', 'Q2'])
+        banner = self.table.response_counts({
+            'testYN': 'LIVE',
+            'status': 'COMPLETE',
+            'counts': [{'questionId': 'Q1', 'resolution': 1}],
+            'filters': [{'questionId': 'Q2', 'responseId': 11}],
+        })
+        self.assertEqual(banner[0]['counts'], [{'responseId': 1, 'count': 1}])
+
+    def test_question_ids_resolved_through_index(self):
+        table = ResponseTable.from_export(io.BytesIO(EXPORT_CSV), index=parse_survey_xml(SURVEY_XML))
+        self.assertEqual(table.counts(101)['total'], 5)
+
+    def test_crosstab(self):
+        table = self.table.crosstab('Q1', 'Q2')
+        self.assertEqual([cut['filter']['responseId'] for cut in table], [10, 11])
+        self.assertEqual(table[0]['counts'], [{'responseId': 1, 'count': 2}, {'responseId': 2, 'count': 1}])
+        filtered = self.table.crosstab('Q1', 'Q2', [{'questionId': 'Q1', 'responseId': 2}])
+        self.assertEqual(filtered[0]['total'], 1)
+        self.assertEqual(filtered[1]['counts'], [])
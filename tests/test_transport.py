@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import mock
+import requests
+
+from unittest import TestCase
+from CmixAPIClient.api import CmixAPI
+from CmixAPIClient.error import CmixConnectionError, CmixError, CmixTimeoutError
+from CmixAPIClient.transport import HTTP2Session, http2_session
+
+
+class TestTransport(TestCase):
+    def setUp(self):
+        self.httpx = mock.Mock()
+        self.httpx.Timeout.side_effect = lambda *args, **kwargs: (args, kwargs)
+        self.httpx.HTTPError = type(str('HTTPError'), (Exception, ), {})
+        self.httpx.TimeoutException = type(str('TimeoutException'), (self.httpx.HTTPError, ), {})
+        self.httpx.NetworkError = type(str('NetworkError'), (self.httpx.HTTPError, ), {})
+
+    def test_http2_session(self):
+        with mock.patch.dict('sys.modules', {'httpx': self.httpx}):
+            session = HTTP2Session(max_connections=4)
+        self.httpx.Client.assert_called_once_with(http2=True, limits=self.httpx.Limits.return_value)
+        self.httpx.Limits.assert_called_once_with(max_connections=4, max_keepalive_connections=4)
+
+        session.get('https://survey-api.cmix.com/surveys', headers={'Authorization': 'Bearer test'}, timeout=(2, 10))
+        self.httpx.Client.return_value.request.assert_called_once_with(
+            'GET',
+            'https://survey-api.cmix.com/surveys',
+            headers={'Authorization': 'Bearer test'},
+            json=None,
+            data=None,
+            timeout=((10, ), {'connect': 2}),
+        )
+        session.post('https://file-processing.cmix.com/surveys/data', data={'data': '<survey/>'}, timeout=5)
+        self.assertEqual(self.httpx.Client.return_value.request.call_args[1]['timeout'], ((5, ), {}))
+        session.close()
+        self.httpx.Client.return_value.close.assert_called_once_with()
+
+    def test_http2_session_falls_back_to_http11(self):
+        with mock.patch.dict('sys.modules', {'httpx': None}):
+            session = http2_session()
+        self.assertIsInstance(session, requests.Session)
+
+    def test_client_http2_option(self):
+        with mock.patch.dict('sys.modules', {'httpx': self.httpx}):
+            cmix_api = CmixAPI(
+                username="test_username",
+                password="test_password",
+                client_id="test_client_id",
+                client_secret="test_client_secret",
+                timeout=5,
+                http2=True
+            )
+        cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+        self.assertIsInstance(cmix_api.session, HTTP2Session)
+        self.httpx.Client.return_value.request.return_value = mock.Mock(status_code=200)
+        cmix_api.get_survey_sources(1337)
+        self.assertEqual(self.httpx.Client.return_value.request.call_args[0][0], 'GET')
+
+    def test_http2_errors_are_cmix_errors(self):
+        with mock.patch.dict('sys.modules', {'httpx': self.httpx}):
+            session = HTTP2Session()
+        client = self.httpx.Client.return_value
+        client.request.side_effect = self.httpx.TimeoutException('read timed out')
+        with self.assertRaises(CmixTimeoutError):
+            session.get('https://survey-api.cmix.com/surveys', timeout=5)
+        client.request.side_effect = self.httpx.NetworkError('connection reset')
+        with self.assertRaises(CmixConnectionError) as raised:
+            session.get('https://survey-api.cmix.com/surveys', timeout=5)
+        self.assertTrue(raised.exception.retryable)
+        client.request.side_effect = self.httpx.HTTPError('bad response')
+        with self.assertRaises(CmixError):
+            session.post('https://survey-api.cmix.com/surveys', timeout=5)
+
+    def test_http2_streams_bodies(self):
+        with mock.patch.dict('sys.modules', {'httpx': self.httpx}):
+            cmix_api = CmixAPI(
+                username="test_username",
+                password="test_password",
+                client_id="test_client_id",
+                client_secret="test_client_secret",
+                timeout=5,
+                http2=True,
+                spill_threshold=4
+            )
+        cmix_api._authentication_headers = {'Authorization': 'Bearer test'}
+        client = self.httpx.Client.return_value
+        client.send.return_value = mock.Mock(status_code=200)
+        client.send.return_value.iter_bytes.return_value = iter([b'<survey', b'/>'])
+        with cmix_api.get_survey_xml(1337, as_file=True) as body:
+            self.assertTrue(body.spilled)
+            self.assertEqual(body.read(), b'<survey/>')
+        self.assertEqual(client.send.call_args, mock.call(client.build_request.return_value, stream=True))
+        client.request.assert_not_called()
+        client.send.return_value.close.assert_called_once_with()
+
+        def reset(chunk_size):
+            yield b'<survey'
+            raise self.httpx.HTTPError('connection reset')
+        client.send.return_value.iter_bytes.side_effect = reset
+        with self.assertRaises(CmixError):
+            cmix_api.get_survey_xml(1337)
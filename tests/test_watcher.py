@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+from __future__ import print_function
+from __future__ import unicode_literals
+import datetime
+import mock
+
+from unittest import TestCase
+from CmixAPIClient.error import CmixError
+from CmixAPIClient.watcher import SurveyStatusWatcher
+
+
+class TestSurveyStatusWatcher(TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.listings = {
+            'DESIGN': [{'id': 1}],
+            'LIVE': [{'id': 2}, {'id': 3}],
+            'CLOSED': [],
+        }
+        self.client.get_surveys.side_effect = lambda status, extra_params=None: self.listings[status]
+
+    def test_first_poll_records_statuses(self):
+        watcher = SurveyStatusWatcher(self.client)
+        self.assertEqual(watcher.poll(), [])
+        self.assertEqual(watcher.statuses, {1: 'design', 2: 'live', 3: 'live'})
+        self.assertEqual(self.client.get_surveys.call_count, 3)
+        self.client.get_surveys.assert_any_call('LIVE', extra_params=None)
+
+    def test_incremental_poll_emits_changes(self):
+        callback = mock.Mock()
+        watcher = SurveyStatusWatcher(self.client, callback=callback, overlap=0)
+        with mock.patch.object(watcher, '_now', return_value=datetime.datetime(2020, 1, 2, 3, 4, 5)):
+            watcher.poll()
+        self.listings = {'DESIGN': [], 'LIVE': [{'id': 1}], 'CLOSED': [{'id': 3}, {'id': 4}]}
+
+        changes = watcher.poll()
+
+        self.client.get_surveys.assert_any_call('CLOSED', extra_params=['statusAfter=2020-01-02T03:04:05'])
+        self.assertEqual(
+            [(change.survey_id, change.old_status, change.new_status) for change in changes],
+            [(1, 'design', 'live'), (3, 'live', 'closed'), (4, None, 'closed')]
+        )
+        self.assertEqual(callback.call_count, 3)
+
+    def test_failed_poll_loses_no_changes(self):
+        watcher = SurveyStatusWatcher(self.client, overlap=0)
+        with mock.patch.object(watcher, '_now', return_value=datetime.datetime(2020, 1, 2, 3, 4, 5)):
+            watcher.poll()
+        self.listings = {'DESIGN': [], 'LIVE': [{'id': 1}], 'CLOSED': [{'id': 3}]}
+
+        def closed_listing_fails(status, extra_params=None):
+            if status == 'CLOSED':
+                raise CmixError('CMIX returned a non-200 response code')
+            return self.listings[status]
+
+        self.client.get_surveys.side_effect = closed_listing_fails
+        with mock.patch.object(watcher, '_now', return_value=datetime.datetime(2020, 1, 2, 3, 5, 5)):
+            with self.assertRaises(CmixError):
+                watcher.poll()
+        self.assertEqual(watcher.statuses, {1: 'design', 2: 'live', 3: 'live'})
+
+        self.client.get_surveys.side_effect = lambda status, extra_params=None: self.listings[status]
+        changes = watcher.poll()
+        self.client.get_surveys.assert_called_with('CLOSED', extra_params=['statusAfter=2020-01-02T03:04:05'])
+        self.assertEqual(
+            [(change.survey_id, change.old_status, change.new_status) for change in changes],
+            [(1, 'design', 'live'), (3, 'live', 'closed')]
+        )
+
+    def test_interval_adapts_to_activity(self):
+        watcher = SurveyStatusWatcher(self.client, min_interval=1, max_interval=10)
+        watcher.poll()
+        watcher.poll()
+        self.assertEqual(watcher.interval, 2.25)
+        self.listings['LIVE'] = [{'id': 2, 'status': 'CLOSED'}]
+        watcher.poll()
+        self.assertEqual(watcher.interval, 1.125)
+
+    def test_watch(self):
+        watcher = SurveyStatusWatcher(self.client, min_interval=0, max_interval=0)
+        watcher.poll()
+        self.listings['LIVE'] = [{'id': 5}]
+        self.assertEqual([change.survey_id for change in watcher.watch(max_polls=2)], [5])
+        self.assertEqual(self.client.get_surveys.call_count, 9)
+
+    def test_stop(self):
+        watcher = SurveyStatusWatcher(self.client)
+        watcher.stop()
+        self.assertEqual(list(watcher.watch()), [])
+        self.client.get_surveys.assert_not_called()